@@ -0,0 +1,429 @@
+# analysis_jobs.py
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager, asynccontextmanager
+from logging_config import logger
+from metrics import CACHE_REQUESTS, track_phase
+
+END_OF_STREAM = "END_OF_STREAM"
+
+
+class AnalysisRejected(Exception):
+    """Se lanza cuando ya hay demasiados análisis en marcha y en cola."""
+
+
+class AnalysisJob:
+    """
+    Un análisis con identificador propio y su registro de mensajes numerados.
+
+    Expone `put()` igual que un `asyncio.Queue`, así que `AnalysisManager` y `ResearchTeamManager`
+    escriben en él sin saber que detrás hay varios oyentes. Cada mensaje recibe un número de
+    secuencia (1, 2, 3...) y cada oyente recorre el registro con `follow()` desde donde se quedó,
+    así que quien llega tarde o se reconecta no se pierde nada.
+    Si hay `log_path`, el registro también se guarda en disco (JSONL) y sobrevive a un reinicio.
+
+    El registro está acotado a `max_events`: pasado ese límite se descartan los mensajes de
+    estado, pero nunca los resultados ni los errores.
+    Si `cancel_grace` no es None, el análisis se cancela cuando el último oyente se va y nadie
+    vuelve en `cancel_grace` segundos.
+    """
+
+    def __init__(self, key: str, job_id: str | None = None, log_path: str | None = None,
+                 max_events: int = 0, cancel_grace: float | None = None):
+        self.key = key
+        self.job_id = job_id or uuid.uuid4().hex
+        self.log_path = log_path
+        self.max_events = max_events
+        self.cancel_grace = cancel_grace
+        self.created_at = time.time()
+        self.finished_at: float | None = None
+        self.messages: list[str] = []
+        self.dropped_events = 0
+        self.done = False
+        self.interrupted = False
+        self.cancelled = False
+        self.listeners = 0
+        self.task: asyncio.Task | None = None
+        self._changed = asyncio.Condition()
+        self._log_lock = asyncio.Lock()
+        self._pending_log: list[str] = []
+        self._cancel_timer: asyncio.TimerHandle | None = None
+
+    @property
+    def status(self) -> str:
+        if not self.done:
+            return "running"
+        if self.interrupted:
+            return "interrupted"
+        if self.cancelled:
+            return "cancelled"
+        return "completed" if self.final_result() is not None else "failed"
+
+    def describe(self) -> dict:
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "events": len(self.messages),
+            "listeners": self.listeners,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+    async def put(self, message: str):
+        # Bajo el candado solo se toca la memoria y se avisa a los oyentes; el disco va después,
+        # para que nadie espere a la escritura del registro para recibir el siguiente mensaje.
+        async with self._changed:
+            if self.done:
+                return
+            if message == END_OF_STREAM:
+                self.done = True
+                self.finished_at = time.time()
+                self._queue_log({"seq": len(self.messages), "end": True, "key": self.key})
+            elif self.max_events and len(self.messages) >= self.max_events and _is_status(message):
+                self.dropped_events += 1
+                return
+            else:
+                self.messages.append(message)
+                self._queue_log({"seq": len(self.messages), "data": message})
+            self._changed.notify_all()
+        await self._flush_log()
+
+    @contextmanager
+    def watch(self):
+        """Registra un oyente mientras dura el bloque; al irse el último, programa la cancelación."""
+        self.listeners += 1
+        if self._cancel_timer is not None:
+            self._cancel_timer.cancel()
+            self._cancel_timer = None
+        try:
+            yield self
+        finally:
+            self.listeners -= 1
+            if self.listeners == 0 and not self.done and self.cancel_grace is not None and self.task is not None:
+                self._cancel_timer = asyncio.get_running_loop().call_later(self.cancel_grace, self._cancel_if_unwatched)
+
+    def detach(self):
+        """A partir de ahora el análisis sigue aunque no quede nadie escuchando."""
+        self.cancel_grace = None
+        if self._cancel_timer is not None:
+            self._cancel_timer.cancel()
+            self._cancel_timer = None
+
+    def _cancel_if_unwatched(self):
+        self._cancel_timer = None
+        if self.listeners == 0 and not self.done and self.task is not None:
+            logger.info("Nadie escucha el análisis, cancelándolo", extra={"job_id": self.job_id})
+            self.task.cancel()
+
+    async def follow(self, after_seq: int = 0, heartbeat: float | None = None):
+        """
+        Emite `(seq, mensaje)` a partir de `after_seq` y sigue el directo hasta el final.
+        Emite `None` si pasan `heartbeat` segundos sin novedades.
+        """
+        index = max(after_seq, 0)
+        while True:
+            async with self._changed:
+                if index >= len(self.messages) and not self.done:
+                    try:
+                        await asyncio.wait_for(self._changed.wait(), timeout=heartbeat)
+                    except asyncio.TimeoutError:
+                        pass
+                pending = self.messages[index:]
+                finished = self.done
+            if not pending and not finished:
+                yield None
+                continue
+            for message in pending:
+                index += 1
+                yield index, message
+            if finished and index >= len(self.messages):
+                return
+
+    def final_result(self) -> str | None:
+        for message in reversed(self.messages):
+            try:
+                if json.loads(message).get("type") == "final_result":
+                    return message
+            except (json.JSONDecodeError, AttributeError):
+                continue
+        return None
+
+    # --- Persistencia en disco ---
+
+    def _queue_log(self, record: dict):
+        if self.log_path:
+            self._pending_log.append(json.dumps(record, ensure_ascii=False) + "\n")
+
+    async def _flush_log(self):
+        """Escribe en orden las líneas pendientes; quien consigue el turno escribe también las de los demás."""
+        if not self._pending_log:
+            return
+        async with self._log_lock:
+            lines, self._pending_log = self._pending_log, []
+            if not lines:
+                return
+            try:
+                await asyncio.to_thread(_append_line, self.log_path, "".join(lines))
+            except OSError as e:
+                logger.warning("No se pudo escribir el registro del análisis", extra={"job_id": self.job_id, "error": str(e)})
+
+    @classmethod
+    def load(cls, job_id: str, log_path: str) -> "AnalysisJob | None":
+        """Reconstruye un análisis desde su registro en disco. Si no llegó a terminar, queda como interrumpido."""
+        try:
+            with open(log_path, encoding="utf-8") as f:
+                records = [json.loads(line) for line in f if line.strip()]
+        except (OSError, json.JSONDecodeError):
+            return None
+        job = cls(key="", job_id=job_id)
+        job.created_at = os.path.getmtime(log_path)
+        for record in records:
+            if record.get("end"):
+                job.key = record.get("key", "")
+                job.finished_at = job.created_at
+            elif "data" in record:
+                job.messages.append(record["data"])
+        job.done = True
+        job.interrupted = job.finished_at is None
+        return job
+
+
+def _is_status(message: str) -> bool:
+    return message.startswith('{"type": "status"')
+
+
+def _append_line(path: str, line: str):
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(line)
+
+
+def last_event_job_id(value: str | None) -> str | None:
+    """Id del job de un `Last-Event-ID` con formato "<job_id>:<seq>", o None si no lo lleva."""
+    if not value:
+        return None
+    event_job_id, _, _ = value.strip().rpartition(":")
+    return event_job_id or None
+
+
+def parse_last_event_id(value: str | None, job_id: str) -> int:
+    """Traduce un `Last-Event-ID` ("<job_id>:<seq>" o "<seq>") al último número de secuencia visto para este job."""
+    if not value:
+        return 0
+    event_job_id, _, seq = value.strip().rpartition(":")
+    if event_job_id and event_job_id != job_id:
+        return 0
+    try:
+        return max(int(seq), 0)
+    except ValueError:
+        return 0
+
+
+class AnalysisCoordinator:
+    """
+    Registro de análisis del proceso.
+
+    - Cada análisis es un `AnalysisJob` con id; se conserva `job_retention` segundos tras terminar
+      (y en `jobs_dir`, si se configura, para poder reproducirlo tras un reinicio).
+    - Si llega un evento igual a uno que ya se está analizando, el nuevo oyente se engancha al
+      mismo `AnalysisJob` en lugar de lanzar otro hilo del Assistant y otra ronda de búsquedas.
+    - El `final_result` de cada análisis completado se guarda `result_ttl` segundos.
+    - Control de admisión: como mucho `max_concurrent` análisis a la vez y `max_queued` esperando
+      turno; por encima de eso se rechaza con `AnalysisRejected`. Los análisis que no pasan por
+      `get_or_start` (los de un lote) reservan plazas con `reserve()` y se ejecutan con `slot()`,
+      así que comparten el mismo límite y cuentan en `stats()`.
+    """
+
+    def __init__(self, result_ttl: float, max_results: int, job_retention: float = 3600, jobs_dir: str | None = None,
+                 max_concurrent: int = 4, max_queued: int = 16, max_events: int = 2000, cancel_grace: float = 15):
+        self.result_ttl = result_ttl
+        self.max_results = max_results
+        self.job_retention = job_retention
+        self.jobs_dir = jobs_dir or None
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.max_events = max_events
+        self.cancel_grace = cancel_grace
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self._running = 0
+        self._reserved = 0
+        self._jobs: dict[str, AnalysisJob] = {}
+        self._in_flight: dict[str, AnalysisJob] = {}
+        self._results: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._last_purge = 0.0
+        if self.jobs_dir:
+            os.makedirs(self.jobs_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(event_data: dict, use_cache: bool) -> str:
+        canonical = json.dumps(event_data, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+        return hashlib.sha256(f"{use_cache}\n{canonical}".encode("utf-8")).hexdigest()
+
+    def get_job(self, job_id: str) -> AnalysisJob | None:
+        self._purge()
+        job = self._jobs.get(job_id)
+        if job is None and self.jobs_dir and _is_job_id(job_id):
+            path = self._log_path(job_id)
+            if os.path.exists(path):
+                job = AnalysisJob.load(job_id, path)
+                if job is not None:
+                    self._jobs[job_id] = job
+        return job
+
+    def stats(self) -> dict:
+        return {
+            "running": self._running,
+            "queued": len(self._in_flight) + self._reserved - self._running,
+            "max_concurrent": self.max_concurrent,
+            "max_queued": self.max_queued,
+            "tracked_jobs": len(self._jobs),
+        }
+
+    async def get_or_start(self, event_data: dict, use_cache: bool, runner, detached: bool = False) -> AnalysisJob:
+        """
+        Devuelve el trabajo para `event_data`. `runner(event_data, job, use_cache)` solo se lanza si no hay uno en curso.
+        Con `detached=True` el análisis sigue aunque no quede nadie escuchando.
+        """
+        self._purge()
+        key = self.make_key(event_data, use_cache)
+
+        cached = self._cached_result(key) if use_cache else None
+        if cached is not None:
+            CACHE_REQUESTS.inc(cache="analysis_result", result="hit")
+            job = self._new_job(key)
+            await job.put(json.dumps({"type": "status", "content": "♻️ Resultado reciente recuperado de caché."}))
+            await job.put(cached)
+            await job.put(END_OF_STREAM)
+            return job
+
+        job = self._in_flight.get(key)
+        if job is not None:
+            CACHE_REQUESTS.inc(cache="analysis_result", result="shared")
+            logger.info("Análisis idéntico en curso, reutilizando su stream", extra={"job_key": key, "job_id": job.job_id})
+            if detached:
+                job.detach()
+            return job
+
+        CACHE_REQUESTS.inc(cache="analysis_result", result="miss")
+        self._check_capacity(1)
+
+        job = self._new_job(key, cancel_grace=None if detached else self.cancel_grace)
+        self._in_flight[key] = job
+        job.task = asyncio.create_task(self._run(job, event_data, use_cache, runner))
+        return job
+
+    def _free_capacity(self) -> int:
+        return self.max_concurrent + self.max_queued - len(self._in_flight) - self._reserved
+
+    def _check_capacity(self, count: int):
+        free = self._free_capacity()
+        if count > free:
+            raise AnalysisRejected(
+                f"No hay plazas para {count} análisis más (libres: {max(free, 0)} de {self.max_concurrent + self.max_queued}). "
+                "Inténtalo de nuevo en unos minutos."
+            )
+
+    def reserve(self, count: int) -> int:
+        """
+        Reserva hasta `count` plazas (en cola o en ejecución) y devuelve cuántas: nunca más de
+        `max_concurrent` ni de las que quedan libres. Si no queda ninguna, lanza `AnalysisRejected`.
+        Se devuelven con `release()`.
+        """
+        self._check_capacity(1)
+        count = min(count, self.max_concurrent, self._free_capacity())
+        self._reserved += count
+        return count
+
+    def release(self, count: int):
+        self._reserved -= count
+
+    @asynccontextmanager
+    async def slot(self):
+        """Turno de ejecución: como mucho `max_concurrent` a la vez, contando en `running` mientras dura."""
+        async with self._slots:
+            self._running += 1
+            try:
+                yield
+            finally:
+                self._running -= 1
+
+    def _new_job(self, key: str, cancel_grace: float | None = None) -> AnalysisJob:
+        job_id = uuid.uuid4().hex
+        job = AnalysisJob(
+            key,
+            job_id=job_id,
+            log_path=self._log_path(job_id) if self.jobs_dir else None,
+            max_events=self.max_events,
+            cancel_grace=cancel_grace,
+        )
+        self._jobs[job_id] = job
+        return job
+
+    def _log_path(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, f"{job_id}.jsonl")
+
+    async def _run(self, job: AnalysisJob, event_data: dict, use_cache: bool, runner):
+        try:
+            if self._slots.locked():
+                await job.put(json.dumps({"type": "status", "content": "⏳ En cola: esperando a que termine otro análisis..."}))
+            async with self.slot():
+                with track_phase("analysis"):
+                    await runner(event_data, job, use_cache)
+        except asyncio.CancelledError:
+            job.cancelled = True
+            await job.put(json.dumps({"type": "error", "content": "Análisis cancelado: no queda ningún cliente conectado."}))
+        finally:
+            await job.put(END_OF_STREAM)
+            self._in_flight.pop(job.key, None)
+            final_result = job.final_result()
+            if final_result is not None:
+                self._store_result(job.key, final_result)
+
+    def _purge(self):
+        """Olvida (y borra del disco) los análisis terminados hace más de `job_retention` segundos."""
+        now = time.time()
+        if now - self._last_purge < 60:
+            return
+        self._last_purge = now
+        for job_id, job in list(self._jobs.items()):
+            if job.done and (job.finished_at or job.created_at) + self.job_retention < now:
+                del self._jobs[job_id]
+        if self.jobs_dir:
+            with os.scandir(self.jobs_dir) as it:
+                for entry in it:
+                    job_id = entry.name.removesuffix(".jsonl")
+                    if job_id in self._jobs or not entry.name.endswith(".jsonl"):
+                        continue
+                    try:
+                        if entry.stat().st_mtime + self.job_retention < now:
+                            os.remove(entry.path)
+                    except OSError:
+                        pass
+
+    def _cached_result(self, key: str) -> str | None:
+        entry = self._results.get(key)
+        if entry is None:
+            return None
+        expires_at, message = entry
+        if expires_at < time.monotonic():
+            del self._results[key]
+            return None
+        self._results.move_to_end(key)
+        return message
+
+    def _store_result(self, key: str, message: str):
+        if self.result_ttl <= 0:
+            return
+        self._results[key] = (time.monotonic() + self.result_ttl, message)
+        self._results.move_to_end(key)
+        while len(self._results) > self.max_results:
+            self._results.popitem(last=False)
+
+
+def _is_job_id(job_id: str) -> bool:
+    return len(job_id) == 32 and all(ch in "0123456789abcdef" for ch in job_id)
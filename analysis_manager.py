@@ -2,88 +2,288 @@
 
 import json
 import asyncio
-from config import openai_client, ASSISTANT_ID
-from research_team import ResearchTeamManager
-from agents import trace, gen_trace_id
-from logging_config import logger
+from dataclasses import dataclass
+from config import (
+    get_openai_client, ASSISTANT_ID,
+    DIRECTOR_ENGINE, DIRECTOR_MODEL, DIRECTOR_MAX_TURNS, DIRECTOR_PROMPT_CACHE_KEY,
+)
+from research_team import ResearchTeamManager, ResearchMemo
+from logging_config import logger, debug_dump
+from metrics import track_phase, DIRECTOR_TOKENS
+from incremental_json import IncrementalJsonParser
+
+# Eventos del stream que traen un cambio de estado del run (no de sus pasos ni mensajes).
+RUN_STATUS_EVENTS = {
+    "thread.run.created", "thread.run.queued", "thread.run.in_progress", "thread.run.requires_action",
+    "thread.run.completed", "thread.run.incomplete", "thread.run.failed", "thread.run.cancelling",
+    "thread.run.cancelled", "thread.run.expired",
+}
+
+TERMINAL_RUN_STATUSES = {"completed", "incomplete", "failed", "cancelling", "cancelled", "expired"}
+
+# Bloques del informe que se envían como `partial_result` en cuanto el Director termina de escribirlos.
+PARTIAL_RESULT_PATHS = [("summary",), ("recommendations", "recommended"), ("recommendations", "alternatives", "*")]
+
+def _partial_result_message(path: tuple, value) -> str:
+    """`{"type": "partial_result", "section": "summary" | "recommended" | "alternatives", "index"?, "content"}`."""
+    message = {"type": "partial_result", "section": path[-2] if isinstance(path[-1], int) else path[-1], "content": value}
+    if isinstance(path[-1], int):
+        message["index"] = path[-1]
+    return json.dumps(message)
+
+# Motivo de fin de Chat Completions -> estado equivalente de un run del Assistant.
+CHAT_FINISH_STATUSES = {"stop": "completed", "length": "incomplete", "content_filter": "failed"}
+
+# --- Configuración del Director para el motor "chat" ---
+@dataclass(frozen=True)
+class DirectorSpec:
+    """Instrucciones, herramientas y parámetros del Assistant, traducidos a una petición de Chat Completions."""
+    model: str
+    instructions: str
+    tools: tuple
+    options: dict
+
+    def request(self) -> dict:
+        # Siempre en el mismo orden (instrucciones y herramientas primero, idénticas en cada análisis) para
+        # que el prefijo del prompt coincida y OpenAI pueda reutilizarlo de su caché de prompts.
+        request = {"model": self.model, "tools": list(self.tools), **self.options}
+        if DIRECTOR_PROMPT_CACHE_KEY:
+            request["extra_body"] = {"prompt_cache_key": DIRECTOR_PROMPT_CACHE_KEY}
+        return request
+
+_director_spec: DirectorSpec | None = None
+_director_spec_task: asyncio.Future | None = None
+
+async def _retrieve_director_spec(client, assistant_id: str) -> DirectorSpec:
+    assistant = await client.beta.assistants.retrieve(assistant_id)
+    tools = []
+    for tool in assistant.tools or []:
+        if tool.type == "function":
+            tools.append({"type": "function", "function": tool.function.model_dump(exclude_none=True)})
+        else:
+            logger.warning("Herramienta del Assistant sin equivalente en Chat Completions, se omite", extra={"tool_type": tool.type})
+    options = {}
+    if assistant.temperature is not None:
+        options["temperature"] = assistant.temperature
+    if assistant.top_p is not None:
+        options["top_p"] = assistant.top_p
+    if assistant.response_format not in (None, "auto"):
+        options["response_format"] = assistant.response_format.model_dump(exclude_none=True)
+    logger.info("Configuración del Director cargada del Assistant", extra={"assistant_id": assistant_id, "model": assistant.model, "tools": len(tools)})
+    return DirectorSpec(model=DIRECTOR_MODEL or assistant.model, instructions=assistant.instructions or "", tools=tuple(tools), options=options)
+
+async def load_director_spec(client=None, assistant_id: str = ASSISTANT_ID) -> DirectorSpec:
+    """Lee el Assistant una sola vez por proceso (las llamadas simultáneas comparten la petición; si falla, se reintenta)."""
+    global _director_spec, _director_spec_task
+    if _director_spec is None:
+        if _director_spec_task is None or _director_spec_task.done():
+            _director_spec_task = asyncio.ensure_future(_retrieve_director_spec(client or get_openai_client(), assistant_id))
+        _director_spec = await asyncio.shield(_director_spec_task)
+    return _director_spec
+
+def _record_director_usage(usage):
+    cached = getattr(getattr(usage, "prompt_tokens_details", None), "cached_tokens", None) or 0
+    DIRECTOR_TOKENS.inc(usage.prompt_tokens, kind="prompt")
+    DIRECTOR_TOKENS.inc(cached, kind="cached")
+    DIRECTOR_TOKENS.inc(usage.completion_tokens, kind="completion")
 
 class AnalysisManager:
-    def __init__(self):
-        self.client = openai_client
+    """
+    Sin estado por análisis: la API crea uno solo al arrancar y lo comparten todas las peticiones.
+    Lo propio de cada análisis (cola de eventos, caché, memo de lote) va en los argumentos de `run`.
+    """
+    def __init__(self, on_final_result=None):
+        self.client = get_openai_client()
+        # Recibe el JSON final y devuelve el id del informe (para descargar sus PDFs sin reenviarlo).
+        self.on_final_result = on_final_result
         self.assistant_id = ASSISTANT_ID
         self.research_team = ResearchTeamManager()
         self.available_functions = { "run_multi_agent_research": self.research_team.run }
 
-    async def run(self, event_data: dict, update_queue: asyncio.Queue):
+    async def _run_tool_calls(self, tool_calls: list[tuple[str, str, str]], update_queue: asyncio.Queue, use_cache: bool,
+                              research_memo: ResearchMemo | None = None) -> list[dict]:
+        """Ejecuta en paralelo las tool calls `(id, nombre, argumentos JSON)` que pide el Director."""
+        async def call(call_id: str, name: str, arguments: str):
+            function_to_call = self.available_functions.get(name)
+            if function_to_call is None:
+                logger.warning("El Director pidió una función desconocida", extra={"function": name})
+                return {"tool_call_id": call_id, "output": f"Error: la función '{name}' no existe."}
+            output = await function_to_call(**json.loads(arguments), update_queue=update_queue, use_cache=use_cache, memo=research_memo)
+            return {"tool_call_id": call_id, "output": output}
+
+        return list(await asyncio.gather(*(call(*tool_call) for tool_call in tool_calls)))
+
+    async def _cancel_remote_run(self, thread_id: str, run_id: str):
+        try:
+            await self.client.beta.threads.runs.cancel(thread_id=thread_id, run_id=run_id)
+            logger.info("Run del Assistant cancelado", extra={"thread_id": thread_id, "run_id": run_id})
+        except Exception as e:
+            logger.warning("No se pudo cancelar el run del Assistant", extra={"run_id": run_id, "error": str(e)})
+
+    async def _direct_with_assistant(self, initial_prompt: str, update_queue: asyncio.Queue, use_cache: bool,
+                                     research_memo: ResearchMemo | None) -> tuple[str, str | None]:
+        """Motor "assistant": thread + run en streaming. Devuelve `(estado final del run, respuesta)`."""
+        with track_phase("director_setup"):
+            thread = await self.client.beta.threads.create()
+        await self.client.beta.threads.messages.create(thread_id=thread.id, role="user", content=initial_prompt)
+
+        # --- Bucle del Director dirigido por eventos (streaming) en lugar de sondear runs.retrieve ---
+        stream_manager = self.client.beta.threads.runs.stream(thread_id=thread.id, assistant_id=self.assistant_id)
+        run, final_response = None, None
+        # Mensajes escritos antes de la última ronda de tool calls: no son el informe final.
+        message_ids, stale_message_ids = set(), set()
+        partial_parser = IncrementalJsonParser(PARTIAL_RESULT_PATHS)
+        try:
+            while True:
+                with track_phase("director"):
+                    async with stream_manager as stream:
+                        async for event in stream:
+                            if event.event in RUN_STATUS_EVENTS:
+                                run = event.data
+                                await update_queue.put(json.dumps({"type": "status", "content": f"🤖 Estado del Director: {run.status}"}))
+                            elif event.event == "thread.message.created":
+                                message_ids.add(event.data.id)
+                                partial_parser = IncrementalJsonParser(PARTIAL_RESULT_PATHS)
+                            elif event.event == "thread.message.delta":
+                                # El informe llega token a token: cada bloque se envía en cuanto su JSON se cierra.
+                                for block in event.data.delta.content or []:
+                                    if block.type == "text" and block.text and block.text.value:
+                                        for path, value in partial_parser.feed(block.text.value):
+                                            await update_queue.put(_partial_result_message(path, value))
+                            elif event.event == "thread.message.completed" and event.data.content:
+                                final_response = event.data.content[0].text.value
+
+                if run is None or run.status != 'requires_action':
+                    break
+                # Lo que el Director escribió antes de pedir las tool calls no es el informe: se descarta.
+                final_response = None
+                stale_message_ids |= message_ids
+                tool_calls = [(tc.id, tc.function.name, tc.function.arguments) for tc in run.required_action.submit_tool_outputs.tool_calls]
+                with track_phase("research"):
+                    tool_outputs = await self._run_tool_calls(tool_calls, update_queue, use_cache, research_memo)
+                stream_manager = self.client.beta.threads.runs.submit_tool_outputs_stream(thread_id=thread.id, run_id=run.id, tool_outputs=tool_outputs)
+        except asyncio.CancelledError:
+            # Nadie espera ya el resultado: paramos también el run remoto para no seguir gastando tokens.
+            if run is not None and run.status not in TERMINAL_RUN_STATUSES:
+                await asyncio.shield(self._cancel_remote_run(thread.id, run.id))
+            raise
+
+        run_status = run.status if run else "unknown"
+        if run_status == 'completed' and final_response is None:
+            messages = await self.client.beta.threads.messages.list(thread_id=thread.id, run_id=run.id, order="desc", limit=1)
+            if messages.data and messages.data[0].id not in stale_message_ids:
+                final_response = messages.data[0].content[0].text.value
+        return run_status, final_response
+
+    async def _direct_with_chat(self, initial_prompt: str, update_queue: asyncio.Queue, use_cache: bool,
+                                research_memo: ResearchMemo | None) -> tuple[str, str | None]:
+        """
+        Motor "chat": el mismo bucle de tool calls sobre Chat Completions en streaming, sin threads ni runs
+        en el servidor (una petición por turno del Director). Devuelve `(estado equivalente, respuesta)`.
+        """
+        with track_phase("director_setup"):
+            spec = await load_director_spec(self.client, self.assistant_id)
+        messages = [{"role": "system", "content": spec.instructions}, {"role": "user", "content": initial_prompt}]
+
+        for _ in range(DIRECTOR_MAX_TURNS):
+            await update_queue.put(json.dumps({"type": "status", "content": "🤖 Estado del Director: in_progress"}))
+            content, tool_calls, finish_reason = [], {}, None
+            partial_parser = IncrementalJsonParser(PARTIAL_RESULT_PATHS)
+            with track_phase("director"):
+                stream = await self.client.chat.completions.create(
+                    **spec.request(), messages=messages, stream=True, stream_options={"include_usage": True})
+                try:
+                    async for chunk in stream:
+                        if chunk.usage:
+                            _record_director_usage(chunk.usage)
+                        if not chunk.choices:
+                            continue
+                        choice = chunk.choices[0]
+                        if choice.delta.content:
+                            content.append(choice.delta.content)
+                            for path, value in partial_parser.feed(choice.delta.content):
+                                await update_queue.put(_partial_result_message(path, value))
+                        # Las tool calls llegan troceadas: se acumulan por índice.
+                        for delta in choice.delta.tool_calls or []:
+                            tool_call = tool_calls.setdefault(delta.index, {"id": "", "name": "", "arguments": ""})
+                            tool_call["id"] = delta.id or tool_call["id"]
+                            if delta.function:
+                                tool_call["name"] += delta.function.name or ""
+                                tool_call["arguments"] += delta.function.arguments or ""
+                        if choice.finish_reason:
+                            finish_reason = choice.finish_reason
+                finally:
+                    await stream.close()
+
+            if finish_reason != "tool_calls":
+                status = CHAT_FINISH_STATUSES.get(finish_reason, "failed")
+                await update_queue.put(json.dumps({"type": "status", "content": f"🤖 Estado del Director: {status}"}))
+                return status, "".join(content) or None
+
+            await update_queue.put(json.dumps({"type": "status", "content": "🤖 Estado del Director: requires_action"}))
+            calls = [tool_calls[index] for index in sorted(tool_calls)]
+            messages.append({"role": "assistant", "content": "".join(content) or None, "tool_calls": [
+                {"id": c["id"], "type": "function", "function": {"name": c["name"], "arguments": c["arguments"]}} for c in calls
+            ]})
+            with track_phase("research"):
+                tool_outputs = await self._run_tool_calls([(c["id"], c["name"], c["arguments"]) for c in calls], update_queue, use_cache, research_memo)
+            messages.extend({"role": "tool", "tool_call_id": o["tool_call_id"], "content": o["output"]} for o in tool_outputs)
+
+        logger.error("El Director superó el máximo de turnos", extra={"max_turns": DIRECTOR_MAX_TURNS})
+        return "incomplete", None
+
+    async def run(self, event_data: dict, update_queue: asyncio.Queue, use_cache: bool = True,
+                  research_memo: ResearchMemo | None = None):
+        from agents import trace, gen_trace_id
         trace_id = gen_trace_id()
         with trace("Análisis de Evento Deportivo", trace_id=trace_id):
             await update_queue.put(json.dumps({"type": "status", "content": f"📊 Ver traza en vivo: [https://platform.openai.com/traces/trace?trace_id=](https://platform.openai.com/traces/trace?trace_id=){trace_id}"}))
             await update_queue.put(json.dumps({"type": "status", "content": "🚀 Iniciando nuevo análisis de evento..."}))
             
-            thread = await self.client.beta.threads.create()
             initial_prompt = f"Por favor, analiza el siguiente evento y genera el informe JSON correspondiente. Datos del evento: {json.dumps(event_data, indent=2)}"
             
-            # --- DEBUGGING: Entrada al Asistente (con flush=True) ---
-            print("\n" + "="*50, flush=True)
-            print("📥 ENVIANDO AL DIRECTOR (ASSISTANT):", flush=True)
-            print(initial_prompt, flush=True)
-            print("="*50 + "\n", flush=True)
-            # ---------------------------------------------------------
-
-            await self.client.beta.threads.messages.create(thread_id=thread.id, role="user", content=initial_prompt)
-            run = await self.client.beta.threads.runs.create(thread_id=thread.id, assistant_id=self.assistant_id)
-
-            while run.status != 'completed':
-                run = await self.client.beta.threads.runs.retrieve(thread_id=thread.id, run_id=run.id)
-                await update_queue.put(json.dumps({"type": "status", "content": f"🤖 Estado del Director: {run.status}"}))
-
-                if run.status == 'requires_action':
-                    tool_outputs = []
-                    for tool_call in run.required_action.submit_tool_outputs.tool_calls:
-                        function_name = tool_call.function.name
-                        function_args = json.loads(tool_call.function.arguments)
-                        if function_name in self.available_functions:
-                            function_to_call = self.available_functions[function_name]
-                            output = await function_to_call(**function_args, update_queue=update_queue)
-                            tool_outputs.append({"tool_call_id": tool_call.id, "output": output})
-                    
-                    run = await self.client.beta.threads.runs.submit_tool_outputs(thread_id=thread.id, run_id=run.id, tool_outputs=tool_outputs)
-                await asyncio.sleep(1)
+            debug_dump("📥 ENVIANDO AL DIRECTOR (ASSISTANT):", initial_prompt)
+
+            if DIRECTOR_ENGINE == "chat":
+                run_status, final_response = await self._direct_with_chat(initial_prompt, update_queue, use_cache, research_memo)
+            else:
+                run_status, final_response = await self._direct_with_assistant(initial_prompt, update_queue, use_cache, research_memo)
 
-            if run.status == 'completed':
+            if run_status == 'completed':
                 await update_queue.put(json.dumps({"type": "status", "content": "✅ Análisis completado. Generando JSON final..."}))
-                messages = await self.client.beta.threads.messages.list(thread_id=thread.id)
-                final_response = messages.data[0].content[0].text.value
                 
                 # --- LÓGICA DE PARSEO DE JSON MEJORADA ---
                 try:
                     json_output = None
-                    # Primero, intenta parsear la respuesta directamente
-                    try:
-                        json_output = json.loads(final_response)
-                    except json.JSONDecodeError:
-                        # Si falla, intenta extraerlo de un bloque de código markdown
-                        print("Respuesta no es JSON puro, intentando extraer de markdown...", flush=True)
-                        json_string = final_response.split('```json\n')[1].split('\n```')[0]
-                        json_output = json.loads(json_string)
-
-                    # --- DEBUGGING: Salida del Asistente (con flush=True) ---
-                    print("\n" + "="*50, flush=True)
-                    print("📤 RESPUESTA RECIBIDA DEL DIRECTOR (ASSISTANT):", flush=True)
-                    print(json.dumps(json_output, indent=2, ensure_ascii=False), flush=True)
-                    print("="*50 + "\n", flush=True)
-                    # ------------------------------------------------------------
-                    
+                    with track_phase("json_parse"):
+                        # Primero, intenta parsear la respuesta directamente
+                        try:
+                            json_output = json.loads(final_response)
+                        except json.JSONDecodeError:
+                            # Si falla, intenta extraerlo de un bloque de código markdown
+                            logger.info("La respuesta del Director no es JSON puro, extrayéndola del bloque markdown")
+                            json_string = final_response.split('```json\n')[1].split('\n```')[0]
+                            json_output = json.loads(json_string)
+
+                    debug_dump("📤 RESPUESTA RECIBIDA DEL DIRECTOR (ASSISTANT):", json_output)
+
                     log_data = {"input": event_data, "output": json_output}
                     logger.info("Análisis de evento completado con éxito", extra=log_data)
                     
-                    await update_queue.put(json.dumps({"type": "final_result", "content": json_output}))
-
                 except Exception as e:
                     logger.error("Error al parsear el JSON final del Assistant", extra={"raw_response": final_response, "error": str(e)})
                     await update_queue.put(json.dumps({"type": "error", "content": f"Error al parsear JSON final: {e}"}))
+                else:
+                    final_message = {"type": "final_result", "content": json_output}
+                    if self.on_final_result is not None:
+                        # Si falla el hook (p. ej. el pre-render de PDFs), el informe se entrega igual, sin `report_id`.
+                        try:
+                            final_message["report_id"] = self.on_final_result(json_output)
+                        except Exception as e:
+                            logger.error("Falló el hook del resultado final", extra={"error": str(e)})
+                    await update_queue.put(json.dumps(final_message))
             else:
-                logger.error(f"El Run del Assistant falló", extra={"run_status": run.status, "event_data": event_data})
-                await update_queue.put(json.dumps({"type": "error", "content": f"El análisis falló. Estado final: {run.status}"}))
+                logger.error(f"El Run del Assistant falló", extra={"run_status": run_status, "event_data": event_data})
+                await update_queue.put(json.dumps({"type": "error", "content": f"El análisis falló. Estado final: {run_status}"}))
             
             await update_queue.put("END_OF_STREAM")
\ No newline at end of file
@@ -1,11 +1,39 @@
+# El informe de arranque empieza a contar aquí: debe ser el primer import.
+from startup import startup_report
 from fastapi import FastAPI, Request, Query
 from fastapi.responses import Response, StreamingResponse
-from pydantic import BaseModel
-from analysis_manager import AnalysisManager
+from pydantic import BaseModel, Field
+from typing import Literal
+from analysis_manager import AnalysisManager, load_director_spec
+from research_team import research_cache, ResearchMemo, get_search_agent
+from analysis_jobs import AnalysisCoordinator, AnalysisRejected, last_event_job_id, parse_last_event_id
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
 import asyncio
+import csv
+import io
 import json
-from playwright.async_api import async_playwright
+import re
+import zipfile
+from browser_pool import BrowserPool, PdfPoolBusy
+from pdf_cache import PdfCache
+from report_templates import generate_html_for_pdf, generate_html_for_mice_pdf
+from fast_pdf import render_fast_pdf
+from report_prerender import ReportPrerenderer
+from config import (
+    PDF_MAX_CONCURRENCY, PDF_PAGE_MAX_RENDERS, PDF_BROWSER_MAX_RENDERS, PDF_QUEUE_TIMEOUT, PDF_RENDERER,
+    PDF_CACHE_MAX_MEMORY_MB, PDF_CACHE_DIR, PDF_CACHE_MAX_DISK_MB, PDF_BATCH_MAX_ITEMS,
+    PDF_PRERENDER_VARIANTS, PDF_PRERENDER_CONCURRENCY, REPORT_RETENTION, REPORT_MAX_ENTRIES,
+    ANALYSIS_RESULT_TTL, ANALYSIS_RESULT_MAX_ENTRIES, ANALYSIS_JOB_RETENTION, ANALYSIS_JOBS_DIR,
+    ANALYSIS_MAX_CONCURRENT, ANALYSIS_MAX_QUEUED, ANALYSIS_MAX_EVENTS, ANALYSIS_CANCEL_GRACE,
+    ANALYSIS_BULK_MAX_EVENTS, ANALYSIS_BULK_CONCURRENCY, DIRECTOR_ENGINE,
+    get_openai_client, close_openai_client,
+)
+from logging_config import logger, start_logging
+from metrics import (
+    registry as metrics_registry, track_phase, server_timing_header,
+    ANALYSES_IN_FLIGHT, ANALYSES_QUEUED, STARTUP_READY_SECONDS,
+)
 
 # --- Modelo de Datos (sin cambios) ---
 class EventInput(BaseModel):
@@ -20,7 +48,86 @@ class EventInput(BaseModel):
     location: str
     requirements: str | None = None
 
-app = FastAPI()
+# --- Exportación de PDFs por lotes ---
+PdfRenderer = Literal["chromium", "fast"]
+
+class PdfBatchItem(BaseModel):
+    template: Literal["sports", "mice"] = "sports"
+    data: dict
+    filename: str | None = None
+    renderer: PdfRenderer | None = None
+
+class PdfBatchRequest(BaseModel):
+    items: list[PdfBatchItem] = Field(min_length=1, max_length=PDF_BATCH_MAX_ITEMS)
+
+# --- Pool de Chromium compartido (se arranca y se cierra con la aplicación) ---
+browser_pool = BrowserPool(
+    max_concurrency=PDF_MAX_CONCURRENCY,
+    page_max_renders=PDF_PAGE_MAX_RENDERS,
+    browser_max_renders=PDF_BROWSER_MAX_RENDERS,
+    queue_timeout=PDF_QUEUE_TIMEOUT,
+)
+
+# --- Caché de PDFs ya renderizados (memoria + disco opcional) ---
+pdf_cache = PdfCache(
+    max_memory_bytes=PDF_CACHE_MAX_MEMORY_MB * 1024 * 1024,
+    disk_dir=PDF_CACHE_DIR,
+    max_disk_bytes=PDF_CACHE_MAX_DISK_MB * 1024 * 1024,
+)
+
+# --- Registro de análisis: jobs reanudables, peticiones idénticas compartidas y resultados recientes ---
+analysis_coordinator = AnalysisCoordinator(
+    result_ttl=ANALYSIS_RESULT_TTL,
+    max_results=ANALYSIS_RESULT_MAX_ENTRIES,
+    job_retention=ANALYSIS_JOB_RETENTION,
+    jobs_dir=ANALYSIS_JOBS_DIR,
+    max_concurrent=ANALYSIS_MAX_CONCURRENT,
+    max_queued=ANALYSIS_MAX_QUEUED,
+    max_events=ANALYSIS_MAX_EVENTS,
+    cancel_grace=ANALYSIS_CANCEL_GRACE,
+)
+ANALYSES_IN_FLIGHT.set_function(lambda: analysis_coordinator.stats()["running"])
+ANALYSES_QUEUED.set_function(lambda: analysis_coordinator.stats()["queued"])
+STARTUP_READY_SECONDS.set_function(lambda: startup_report.ready_seconds or 0)
+
+# --- Director compartido por todas las peticiones (se crea al arrancar) ---
+_analysis_manager: AnalysisManager | None = None
+
+def get_analysis_manager() -> AnalysisManager:
+    global _analysis_manager
+    if _analysis_manager is None:
+        _analysis_manager = AnalysisManager(on_final_result=report_prerenderer.submit)
+    return _analysis_manager
+
+def _warmup_hooks() -> list[tuple]:
+    """Lo que conviene tener listo antes de la primera petición, en orden; cada paso se mide en el informe de arranque."""
+    hooks = [
+        ("logging", start_logging),
+        ("openai_client", get_openai_client),
+        ("analysis_manager", get_analysis_manager),
+        ("agents_sdk", get_search_agent),
+    ]
+    if DIRECTOR_ENGINE == "chat":
+        hooks.append(("director_spec", load_director_spec))
+    # Chromium (el renderizador por defecto) se arranca aquí; con `PDF_RENDERER=fast` no se lanza
+    # hasta que una petición pida expresamente `renderer=chromium`.
+    if PDF_RENDERER == "chromium":
+        hooks.append(("chromium", browser_pool.start))
+    return hooks
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await startup_report.run_warmup(_warmup_hooks())
+    for name, error in startup_report.errors.items():
+        # Lo que no se pudo calentar ahora (p. ej. Chromium) se reintenta en el primer uso.
+        logger.error("Falló un paso del calentamiento al iniciar la API", extra={"step": name, "error": error})
+    logger.info("API lista", extra=startup_report.as_dict())
+    yield
+    await report_prerenderer.stop()
+    await browser_pool.stop()
+    await close_openai_client()
+
+app = FastAPI(lifespan=lifespan)
 
 # --- CORS Middleware (sin cambios) ---
 origins = ["*"] # Puedes restringir esto a tu dominio en producción
@@ -35,309 +142,396 @@ async def root():
 async def healthz():
     return {"health": "ok"}
 
-async def run_analysis_in_background(event_data: dict, queue: asyncio.Queue):
-    manager = AnalysisManager()
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    return Response(content=metrics_registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/analysis-jobs/stats", include_in_schema=False)
+async def analysis_jobs_stats():
+    return analysis_coordinator.stats()
+
+@app.get("/research-cache/stats", include_in_schema=False)
+async def research_cache_stats():
+    return research_cache.stats()
+
+@app.get("/startup", include_in_schema=False)
+async def startup_stats():
+    return startup_report.as_dict()
+
+@app.get("/reports/stats", include_in_schema=False)
+async def reports_stats():
+    return report_prerenderer.stats()
+
+async def run_analysis_in_background(event_data: dict, queue: asyncio.Queue, use_cache: bool = True,
+                                    research_memo: ResearchMemo | None = None):
     try:
-        await manager.run(event_data, queue)
+        await get_analysis_manager().run(event_data, queue, use_cache, research_memo)
     except Exception as e:
         error_message = {"type": "error", "content": f"Ha ocurrido un error fatal: {e}"}
         await queue.put(json.dumps(error_message))
-    finally:
-        await queue.put("END_OF_STREAM")
+    # Si el análisis se cancela, el coordinador registra la cancelación y cierra el stream.
+    await queue.put("END_OF_STREAM")
 
 @app.get("/analyze-stream")
-async def analyze_event_stream(request: Request, event_data_json: str = Query(...)):
+async def analyze_event_stream(request: Request, event_data_json: str = Query(...), bypass_cache: bool = Query(False)):
     try:
         event_data_dict = json.loads(event_data_json)
         event_data = EventInput.model_validate(event_data_dict)
     except Exception as e:
         return {"error": f"Datos de entrada inválidos: {e}"}
     
+    # Si el navegador se reconecta solo, manda `Last-Event-ID` ("<job_id>:<seq>") y retomamos ese
+    # mismo job desde ese punto, haya terminado o no, como en `/analysis-jobs/{id}/events`.
+    last_event_id = request.headers.get("last-event-id")
+    resumed_job_id = last_event_job_id(last_event_id)
+    if resumed_job_id is not None:
+        job = analysis_coordinator.get_job(resumed_job_id)
+        if job is None:
+            return _json_error(404, "Análisis no encontrado")
+        return _job_event_stream(request, job, parse_last_event_id(last_event_id, job.job_id))
+
+    # Peticiones idénticas comparten el mismo análisis (o su resultado reciente).
+    try:
+        job = await analysis_coordinator.get_or_start(event_data.model_dump(), not bypass_cache, run_analysis_in_background)
+    except AnalysisRejected as e:
+        return _json_error(429, str(e), headers={"Retry-After": "30"})
+    return _job_event_stream(request, job, parse_last_event_id(last_event_id, job.job_id))
+
+# --- TRABAJOS DE ANÁLISIS DURADEROS (crear, consultar, reconectar) ---
+
+def _json_error(status_code: int, message: str, headers: dict | None = None) -> Response:
+    return Response(content=json.dumps({"error": message}), status_code=status_code, media_type="application/json", headers=headers)
+
+def _job_event_stream(request: Request, job, after_seq: int) -> StreamingResponse:
     async def event_generator():
-        queue = asyncio.Queue()
-        asyncio.create_task(run_analysis_in_background(event_data.model_dump(), queue))
-        while True:
-            if await request.is_disconnected(): break
-            try:
-                message = await asyncio.wait_for(queue.get(), timeout=20.0)
-                if message == "END_OF_STREAM": break
-                yield f"data: {message}\n\n"
-            except asyncio.TimeoutError:
-                yield ": heartbeat\n\n"
-            
-    return StreamingResponse(event_generator(), media_type="text/event-stream")
-
-# --- LÓGICA DE GENERACIÓN DE PDF (ACTUALIZADA) ---
-
-def _format_currency(value):
-    if not isinstance(value, (int, float)): return "N/A"
-    return f"{value:,.0f} €".replace(",", ".")
-
-def _generate_kpi_table(city_data):
-    kpis = {
-        "ROI Estimado": f"{city_data.get('kpi_main', {}).get('roi_est', 'N/A')}x",
-        "Impacto Directo (€)": _format_currency(city_data.get('kpi_economic', {}).get('direct_impact_eur')),
-        "Puntuación Legado": f"{city_data.get('kpi_main', {}).get('legacy_score', 'N/A')} / 10",
-        "Potencial Patrocinio": f"{city_data.get('kpi_main', {}).get('sponsorship_potential', 'N/A')} / 10",
-        "ADR Hotel (€)": _format_currency(city_data.get('kpi_economic', {}).get('adr_eur')),
-        "Media Value (€)": _format_currency(city_data.get('kpi_sponsorship', {}).get('media_value_eur')),
-        "Impacto SEA": f"{city_data.get('kpi_main', {}).get('sea_impact_score', 'N/A')} / 100",
-        "Ajuste Presupuesto": f"{city_data.get('kpi_economic', {}).get('budget_fit_percent', 'N/A')}%"
-    }
-    rows_html = ""
-    kpi_items = list(kpis.items())
-    for i in range(0, len(kpi_items), 2):
-        rows_html += "<tr>"
-        label1, value1 = kpi_items[i]
-        rows_html += f"<th>{label1}</th><td>{value1}</td>"
-        if i + 1 < len(kpi_items):
-            label2, value2 = kpi_items[i+1]
-            rows_html += f"<th>{label2}</th><td>{value2}</td>"
-        else:
-            rows_html += "<th></th><td></td>"
-        rows_html += "</tr>"
-    return rows_html
-
-def _generate_city_html(city_data, is_recommended=False):
-    badge = '<span class="badge">⭐ RECOMENDADO</span>' if is_recommended else ''
-    return f"""
-    <div class="card">
-        <div class="card-header">
-            <h3>{city_data.get('name', 'N/A')} {badge}</h3>
-            <p class="venue">📍 {city_data.get('main_venue', 'N/A')}</p>
-        </div>
-        <div class="card-body">
-            <h4>Indicadores Clave de Rendimiento (KPIs)</h4>
-            <table class="kpi-table">{_generate_kpi_table(city_data)}</table>
-        </div>
-    </div>
-    """
+        # Mientras dure el stream contamos como oyente; si se va el último, el análisis se cancela.
+        with job.watch():
+            async for item in job.follow(after_seq, heartbeat=20.0):
+                if await request.is_disconnected(): break
+                if item is None:
+                    yield ": heartbeat\n\n"
+                else:
+                    seq, message = item
+                    yield f"id: {job.job_id}:{seq}\ndata: {message}\n\n"
+
+    return StreamingResponse(event_generator(), media_type="text/event-stream", headers={"X-Analysis-Job-Id": job.job_id})
+
+@app.post("/analysis-jobs", status_code=202)
+async def create_analysis_job(event_data: EventInput, bypass_cache: bool = Query(False), detached: bool = Query(False)):
+    """Crea (o reutiliza) un análisis. Con `detached=true` sigue aunque ningún cliente esté escuchando."""
+    try:
+        job = await analysis_coordinator.get_or_start(event_data.model_dump(), not bypass_cache, run_analysis_in_background, detached=detached)
+    except AnalysisRejected as e:
+        return _json_error(429, str(e), headers={"Retry-After": "30"})
+    return {**job.describe(), "events_url": f"/analysis-jobs/{job.job_id}/events"}
+
+@app.get("/analysis-jobs/{job_id}")
+async def get_analysis_job(job_id: str):
+    job = analysis_coordinator.get_job(job_id)
+    if job is None:
+        return _json_error(404, "Análisis no encontrado")
+    return job.describe()
+
+@app.get("/analysis-jobs/{job_id}/events")
+async def stream_analysis_job_events(request: Request, job_id: str, last_event_id: str | None = Query(None)):
+    """Reproduce los eventos posteriores a `Last-Event-ID` (cabecera o query) y después sigue el directo."""
+    job = analysis_coordinator.get_job(job_id)
+    if job is None:
+        return _json_error(404, "Análisis no encontrado")
+    after_seq = parse_last_event_id(request.headers.get("last-event-id") or last_event_id, job.job_id)
+    return _job_event_stream(request, job, after_seq)
 
+# --- ANÁLISIS EN LOTE: muchos eventos como una sola carga de trabajo ---
 
-def generate_html_for_pdf(data: dict) -> str:
-    event = data.get('event', {})
-    recommendations = data.get('recommendations', {})
-    recommended_city = recommendations.get('recommended')
-    alternative_cities = recommendations.get('alternatives', [])
-    alternatives_html = "".join([_generate_city_html(city) for city in alternative_cities])
-
-    html_content = f"""
-    <!DOCTYPE html>
-    <html lang="es">
-    <head>
-        <meta charset="UTF-8">
-        <link href="https://fonts.googleapis.com/css2?family=Montserrat:wght@400;600;700&display=swap" rel="stylesheet">
-        <style>
-            :root {{
-                --bg-dark: #1a1d24; --card-bg: #2c303a; --border-color: #4a5568;
-                --text-primary: #e2e8f0; --text-secondary: #94a3b8;
-                --accent-green: #10B981; --accent-blue: #3B82F6;
-            }}
-            @page {{ margin: 0; }}
-            *, *::before, *::after {{ box-sizing: border-box; }}
-            html, body {{
-                margin: 0; padding: 0; width: 100%; min-height: 100%;
-                background-color: var(--bg-dark) !important;
-                -webkit-print-color-adjust: exact !important;
-                print-color-adjust: exact !important;
-            }}
-            body {{ font-family: 'Montserrat', sans-serif; color: var(--text-primary); }}
-            
-            .report-container {{
-                width: 100%;
-                max-width: 800px;
-                margin: auto;
-                padding: 25px; /* <-- CAMBIO: Reducido de 30px a 25px */
-            }}
-            .header {{
-                background-color: var(--card-bg); border: 1px solid var(--border-color); border-radius: 12px;
-                text-align: center; padding: 20px; margin-bottom: 15px;
-            }}
-            .header h1 {{ color: #fff; font-size: 24px; margin: 0 0 10px 0; }}
-            .header p {{ color: var(--accent-green); font-size: 16px; margin: 0; font-weight: 600; }}
-            .card {{
-                background-color: var(--card-bg); border: 1px solid var(--border-color);
-                border-radius: 12px;
-                margin-bottom: 20px;
-                page-break-inside: avoid;
-                margin-top: 20px; /* <-- CAMBIO: Añadido margen superior a todas las cajas */
-            }}
-            .header + .card {{
-                margin-top: 0; /* <-- CAMBIO: Eliminamos el margen superior solo a la primera caja después del header */
-            }}
-            .card-header {{
-                padding: 12px 15px; /* <-- CAMBIO: Reducido el padding vertical */
-                border-bottom: 1px solid var(--border-color);
-            }}
-            .card-header h3 {{ font-size: 20px; color: #fff; margin: 0; display: inline-block; }}
-            .card-header .venue {{ font-size: 13px; color: var(--accent-blue); margin: 5px 0 0 0; }}
-            .badge {{
-                display: inline-block; background-color: var(--accent-green); color: #fff;
-                padding: 4px 10px; border-radius: 20px; font-size: 11px; font-weight: 600;
-                margin-left: 10px; vertical-align: middle;
-            }}
-            .card-body {{
-                padding: 15px 20px; /* <-- CAMBIO: Reducido el padding vertical */
-            }}
-            .card-body h4 {{ font-size: 15px; color: #fff; margin: 0 0 12px 0; border-bottom: 1px solid var(--border-color); padding-bottom: 8px; }}
-            .summary-text {{ font-size: 13px; line-height: 1.6; color: var(--text-secondary); }}
-            .kpi-table {{ width: 100%; border-collapse: collapse; }}
-            .kpi-table th, .kpi-table td {{ padding: 8px; text-align: left; border-bottom: 1px solid var(--border-color); font-size: 13px; }}
-            .kpi-table th {{ color: var(--text-secondary); font-weight: 400; width: 25%; }}
-            .kpi-table td {{ color: #fff; font-weight: 600; width: 25%; }}
-        </style>
-    </head>
-    <body>
-        <div class="report-container">
-            <div class="header">
-                <h1>Informe de Potencial para Eventos Deportivos</h1>
-                
-            </div>
-            <div class="card">
-                <div class="card-header"><h3>📝 Resumen Ejecutivo</h3></div>
-                <div class="card-body"><p class="summary-text">{data.get('summary', 'No disponible.')}</p></div>
-            </div>
-            {_generate_city_html(recommended_city, is_recommended=True) if recommended_city else ''}
-            {alternatives_html}
-        </div>
-    </body>
-    </html>
+def parse_bulk_events(body: bytes, fmt: str) -> list[dict]:
+    """Lee eventos en JSONL (uno por línea) o CSV (cabecera con los campos de `EventInput`) y los valida."""
+    text = body.decode("utf-8-sig")
+    if fmt == "csv":
+        reader = csv.DictReader(io.StringIO(text))
+        # Las celdas vacías cuentan como campo no informado (p. ej. `attendeesMax`, `requirements`).
+        rows = [(reader.line_num, {k: (v if v != "" else None) for k, v in row.items()}) for row in reader]
+    else:
+        rows = []
+        for line_num, line in enumerate(text.splitlines(), start=1):
+            if line.strip():
+                try:
+                    rows.append((line_num, json.loads(line)))
+                except json.JSONDecodeError as e:
+                    raise ValueError(f"línea {line_num}: JSON inválido ({e})")
+    if not rows:
+        raise ValueError("no hay eventos")
+    if len(rows) > ANALYSIS_BULK_MAX_EVENTS:
+        raise ValueError(f"demasiados eventos ({len(rows)}); el máximo es {ANALYSIS_BULK_MAX_EVENTS}")
+    events = []
+    for line_num, row in rows:
+        try:
+            events.append(EventInput.model_validate(row).model_dump())
+        except Exception as e:
+            raise ValueError(f"línea {line_num}: {e}")
+    return events
+
+class _ClosingStreamingResponse(StreamingResponse):
+    """`StreamingResponse` que llama a `on_close()` al terminar, también si el generador no llegó a arrancar."""
+    def __init__(self, content, on_close, **kwargs):
+        super().__init__(content, **kwargs)
+        self.on_close = on_close
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.on_close()
+
+class _BulkResultSink:
+    """Destino de los mensajes de un análisis del lote: solo se queda con el resultado final o el error."""
+    def __init__(self):
+        self.result: dict | None = None
+
+    async def put(self, message: str):
+        try:
+            data = json.loads(message)
+        except json.JSONDecodeError:
+            return  # END_OF_STREAM
+        if isinstance(data, dict) and data.get("type") in ("final_result", "error"):
+            self.result = data
+
+async def _run_bulk_event(index: int, event_data: dict, use_cache: bool, memo: ResearchMemo, slots: asyncio.Semaphore) -> dict:
+    sink = _BulkResultSink()
+    # `slots` limita el lote a las plazas que reservó; el turno del coordinador, al límite global del proceso.
+    async with slots, analysis_coordinator.slot():
+        with track_phase("bulk_event"):
+            await run_analysis_in_background(event_data, sink, use_cache, research_memo=memo)
+    if sink.result is None:
+        return {"type": "error", "index": index, "event": event_data, "content": "El análisis terminó sin resultado"}
+    return {**sink.result, "index": index, "event": event_data}
+
+@app.post("/analyze-bulk")
+async def analyze_bulk(request: Request, format: Literal["jsonl", "csv"] | None = Query(None), bypass_cache: bool = Query(False)):
+    """
+    Analiza una lista de eventos (JSONL o CSV, según `format` o el Content-Type) como una sola carga:
+    los temas y búsquedas idénticos se investigan una vez para todo el lote, se ejecutan como mucho
+    `ANALYSIS_BULK_CONCURRENCY` análisis a la vez y cada resultado se envía (NDJSON) en cuanto termina.
+    Esas plazas cuentan en el control de admisión global: se reservan las que queden libres (como
+    mucho `max_concurrent`) y solo si no queda ninguna se responde 429.
     """
-    return html_content
+    fmt = format or ("csv" if "csv" in request.headers.get("content-type", "") else "jsonl")
+    try:
+        events = parse_bulk_events(await request.body(), fmt)
+    except (ValueError, UnicodeDecodeError) as e:
+        return _json_error(422, f"Lote inválido: {e}")
+
+    # El lote ocupa hasta ANALYSIS_BULK_CONCURRENCY plazas del control de admisión global mientras
+    # dura (menos si no quedan tantas libres: el lote simplemente va más despacio).
+    try:
+        reserved = analysis_coordinator.reserve(min(len(events), ANALYSIS_BULK_CONCURRENCY))
+    except AnalysisRejected as e:
+        return _json_error(429, str(e), headers={"Retry-After": "30"})
+    memo = ResearchMemo()
+    slots = asyncio.Semaphore(reserved)
+    closed = False
+
+    def close_bulk():
+        # Se llama al acabar el stream y al cerrarse la respuesta (aunque el cuerpo no llegue a
+        # empezar, p. ej. si el cliente se va antes): solo la primera vez hace algo.
+        nonlocal closed
+        if not closed:
+            closed = True
+            memo.close()
+            analysis_coordinator.release(reserved)
+
+    async def result_stream():
+        tasks = [asyncio.create_task(_run_bulk_event(i, event, not bypass_cache, memo, slots)) for i, event in enumerate(events)]
+        completed = 0
+        try:
+            yield json.dumps({"type": "accepted", "events": len(events), "concurrency": reserved}) + "\n"
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=20.0, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    yield json.dumps({"type": "heartbeat", "completed": completed}) + "\n"
+                for task in done:
+                    completed += 1
+                    try:
+                        yield json.dumps(task.result(), ensure_ascii=False) + "\n"
+                    except Exception as e:
+                        yield json.dumps({"type": "error", "content": f"Ha ocurrido un error fatal: {e}"}) + "\n"
+            yield json.dumps({"type": "bulk_complete", "events": len(events), "shared_research": memo.stats()}) + "\n"
+        finally:
+            # Si el cliente se va, no seguimos analizando (ni investigando) para nadie.
+            for task in tasks:
+                task.cancel()
+            close_bulk()
+
+    return _ClosingStreamingResponse(result_stream(), on_close=close_bulk, media_type="application/x-ndjson")
+
+# --- LÓGICA DE GENERACIÓN DE PDF ---
+# Las plantillas HTML están precompiladas en `report_templates.py`; el renderizador sin
+# navegador está en `fast_pdf.py`.
 
 @app.post("/generate-pdf")
-async def generate_pdf_endpoint(data: dict):
-    html_content = generate_html_for_pdf(data)
-    async with async_playwright() as p:
-        browser = await p.chromium.launch()
-        page = await browser.new_page()
-        await page.set_content(html_content)
-        await page.emulate_media(media="print")
-        
-        pdf_bytes = await page.pdf(
-            format="A4",
-            print_background=True,
-            # 3. Aplicamos el margen 0 también aquí para máxima seguridad
-            margin={"top": "0px", "bottom": "0px", "left": "0px", "right": "0px"}
-        )
-        
-        await browser.close()
-    return Response(content=pdf_bytes, media_type="application/pdf")
-
-
-# --- LÓGICA DE GENERACIÓN DE PDF PARA "IA MICE"  ---
-
-def _generate_mice_kpi_html(kpi_data):
-    """Genera el HTML para los KPIs del informe MICE."""
-    kpis = {
-        "ROI Estimado": f"{kpi_data.get('roi_est', 'N/A')}x",
-        "ADR Hotel (€)": _format_currency(kpi_data.get('adr_eur')),
-        "Capacidad Venue": f"{kpi_data.get('venue_capacity', 'N/A')}",
-        "Huella CO₂ (kg)": f"{kpi_data.get('co2_kg', 'N/A')}"
-    }
-    return "".join([f'<div><span>{label}:</span> <strong>{value}</strong></div>' for label, value in kpis.items()])
-
-def _generate_mice_city_html(city_data, is_recommended=False):
-    """Genera el bloque HTML para una ciudad del informe MICE."""
-    title = "🏆 Sede Recomendada" if is_recommended else "🏙️ Sede Alternativa"
-    badge_color = "#48bb78" if is_recommended else "#ed8936"
-    
-    return f"""
-    <div class="card">
-        <div class="card-header" style="background-color: {badge_color};">
-            {title}: {city_data.get('name', 'N/A')}
-        </div>
-        <div class="card-body">
-            <p class="venue">📍 {city_data.get('logistics', {}).get('main_venue', 'N/A')}</p>
-            <div class="kpi-block">
-                {_generate_mice_kpi_html(city_data.get('kpi', {}))}
-            </div>
-        </div>
-    </div>
+async def generate_pdf_endpoint(data: dict, request: Request, renderer: PdfRenderer | None = Query(None)):
+    return await _pdf_response(request, data, "sports", renderer or PDF_RENDERER)
+
+@app.post("/generate-pdf-mice")
+async def generate_mice_pdf_endpoint(data: dict, request: Request, renderer: PdfRenderer | None = Query(None)):
+    return await _pdf_response(request, data, "mice", renderer or PDF_RENDERER)
+
+@app.get("/reports/{report_id}/pdf")
+async def get_report_pdf(report_id: str, request: Request, variant: Literal["sports", "mice"] = Query("sports"),
+                         renderer: PdfRenderer | None = Query(None)):
     """
+    PDF de un análisis terminado, por el `report_id` de su `final_result`: sale de la caché si el
+    render anticipado ya terminó, espera a ese render si sigue en curso, o lo renderiza ahora.
+    """
+    data = report_prerenderer.get(report_id)
+    if data is None:
+        return _json_error(404, "Informe no encontrado o caducado; envíalo a /generate-pdf o /generate-pdf-mice")
+    return await _pdf_response(request, data, variant, renderer or PDF_RENDERER)
+
+
+# --- RENDER Y CACHÉ COMPARTIDOS POR LOS ENDPOINTS DE PDF ---
+
+# Sube esta versión al cambiar las plantillas para invalidar la caché de disco.
+PDF_TEMPLATE_VERSION = "3"
+
+PDF_VARIANTS = {
+    "sports": {
+        "html": generate_html_for_pdf,
+        # 3. Aplicamos el margen 0 también aquí para máxima seguridad
+        "pdf_options": {"format": "A4", "print_background": True, "margin": {"top": "0px", "bottom": "0px", "left": "0px", "right": "0px"}},
+    },
+    "mice": {
+        "html": generate_html_for_mice_pdf,
+        "pdf_options": {"format": "A4", "print_background": True, "margin": {"top": "0.5in", "bottom": "0.5in", "left": "0.5in", "right": "0.5in"}},
+    },
+}
 
-def generate_html_for_mice_pdf(data: dict) -> str:
+async def render_report_pdf(data: dict, variant: str, timings: dict | None = None, renderer: str = "chromium") -> bytes:
     """
-    Genera un string HTML auto-contenido y estilizado para el informe de IA MICE.
+    Devuelve el PDF de la variante pedida, desde la caché o renderizándolo (en el pool de Chromium
+    o, con `renderer="fast"`, en Python puro). Si se pasa `timings`, se rellena con la duración de
+    cada fase del render.
+    """
+    spec = PDF_VARIANTS[variant]
+
+    async def render():
+        if renderer == "fast":
+            with track_phase("pdf_fast_render", timings):
+                return await asyncio.to_thread(render_fast_pdf, data, variant)
+        with track_phase("pdf_html", timings):
+            html_content = spec["html"](data)
+        return await browser_pool.render_pdf(html_content, timings=timings, **spec["pdf_options"])
+
+    return await pdf_cache.get_or_create(pdf_cache_key(data, variant, renderer), render)
+
+# --- Informes terminados: id para descargar sus PDFs, que se renderizan en cuanto acaba el análisis ---
+report_prerenderer = ReportPrerenderer(
+    render=render_report_pdf,
+    variants=PDF_PRERENDER_VARIANTS,
+    renderer=PDF_RENDERER,
+    max_reports=REPORT_MAX_ENTRIES,
+    retention=REPORT_RETENTION,
+    max_concurrency=PDF_PRERENDER_CONCURRENCY,
+)
+
+def pdf_cache_key(data: dict, variant: str, renderer: str = "chromium") -> str:
+    return PdfCache.make_key(data, f"{variant}-{renderer}-v{PDF_TEMPLATE_VERSION}")
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+async def _pdf_response(request: Request, data: dict, variant: str, renderer: str) -> Response:
+    etag = f'"{pdf_cache_key(data, variant, renderer)}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    # Mismo contenido => mismo ETag, así que ni siquiera hace falta mirar la caché.
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    timings = {}
+    try:
+        with track_phase(f"pdf_total_{variant}", timings):
+            pdf_bytes = await render_report_pdf(data, variant, timings, renderer)
+    except PdfPoolBusy as e:
+        return _json_error(503, str(e), headers={"Retry-After": "5"})
+    cache_status = "miss" if "pdf_print" in timings or "pdf_fast_render" in timings else "hit"
+    headers["Server-Timing"] = server_timing_header(timings, {"cache": cache_status})
+    return Response(content=pdf_bytes, media_type="application/pdf", headers=headers)
+
+
+# --- EXPORTACIÓN POR LOTES: ZIP EN STREAMING ---
+
+class _ZipChunkWriter:
+    """Destino no 'seekable' para zipfile: acumula los bytes escritos hasta que se envían al cliente."""
+    def __init__(self):
+        self._chunks: list[bytes] = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def _batch_filename(index: int, item: PdfBatchItem) -> str:
+    base = re.sub(r"[^\w.-]+", "_", item.filename or item.template).strip("._") or item.template
+    base = base.removesuffix(".pdf")
+    # El índice delante garantiza nombres únicos dentro del ZIP.
+    return f"{index + 1:03d}-{base}.pdf"
+
+@app.post("/generate-pdf-batch")
+async def generate_pdf_batch_endpoint(batch: PdfBatchRequest):
     """
-    event = data.get('event', {})
-    recommendations = data.get('recommendations', {})
-    recommended_city = recommendations.get('recommended')
-    alternative_cities = recommendations.get('alternatives', [])
-    alternatives_html = "".join([_generate_mice_city_html(city) for city in alternative_cities])
-
-    html_content = f"""
-    <!DOCTYPE html>
-    <html lang="es">
-    <head>
-        <meta charset="UTF-8">
-        <link href="https://fonts.googleapis.com/css2?family=Segoe+UI:wght@400;600;700&display=swap" rel="stylesheet">
-        <style>
-            @page {{ margin: 0; }}
-            *, *::before, *::after {{ box-sizing: border-box; }}
-            html, body {{
-                margin: 0; padding: 0; width: 100%;
-                background-color: #f0f2f5 !important;
-                -webkit-print-color-adjust: exact !important;
-                print-color-adjust: exact !important;
-            }}
-            body {{ font-family: 'Segoe UI', sans-serif; color: #2d3748; }}
-            .report-container {{ width: 100%; max-width: 800px; margin: auto; padding: 40px; }}
-            .header {{
-                text-align: center; padding-bottom: 20px;
-                border-bottom: 3px solid #667eea; margin-bottom: 30px;
-            }}
-            .header h1 {{ color: #667eea; font-size: 28px; margin: 0; }}
-            .card {{
-                background-color: #fff; border: 1px solid #e2e8f0; border-radius: 12px;
-                margin-bottom: 25px; page-break-inside: avoid; overflow: hidden;
-                box-shadow: 0 10px 25px rgba(0,0,0,0.05);
-            }}
-            .card-header {{
-                color: white; padding: 15px 20px; font-size: 18px; font-weight: 600;
-                background: linear-gradient(135deg, #667eea, #764ba2);
-            }}
-            .card-body {{ padding: 20px; }}
-            .card-body h3 {{ font-size: 16px; margin: 0 0 15px 0; border-bottom: 1px solid #e2e8f0; padding-bottom: 10px; }}
-            .summary-text {{ font-size: 14px; line-height: 1.6; color: #4a5568; }}
-            .venue {{ font-weight: 600; color: #667eea; margin-bottom: 15px; }}
-            .kpi-block div {{
-                display: flex; justify-content: space-between;
-                padding: 8px 0; border-bottom: 1px solid #f7fafc;
-                font-size: 14px;
-            }}
-            .kpi-block div:last-child {{ border-bottom: none; }}
-            .kpi-block div span {{ color: #718096; }}
-        </style>
-    </head>
-    <body>
-        <div class="report-container">
-            <div class="header"><h1>📊 Informe de Recomendaciones IA MICE</h1></div>
-            <div class="card">
-                <div class="card-header" style="background: #fff; color: #2d3748;"><h3>📝 Resumen Ejecutivo</h3></div>
-                <div class="card-body"><p class="summary-text">{data.get('summary', 'No disponible.')}</p></div>
-            </div>
-            {_generate_mice_city_html(recommended_city, is_recommended=True) if recommended_city else ''}
-            {alternatives_html}
-        </div>
-    </body>
-    </html>
+    Renderiza todos los informes del lote en paralelo (acotado por el pool de Chromium) y devuelve
+    un ZIP en streaming: cada PDF se añade en cuanto termina. Los errores por elemento no abortan
+    el lote; quedan registrados en `manifest.json`, que se escribe al final del ZIP.
     """
-    return html_content
+    semaphore = asyncio.Semaphore(browser_pool.max_concurrency)
 
-@app.post("/generate-pdf-mice")
-async def generate_mice_pdf_endpoint(data: dict):
-    html_content = generate_html_for_mice_pdf(data)
-    async with async_playwright() as p:
-        browser = await p.chromium.launch()
-        page = await browser.new_page()
-        await page.set_content(html_content)
-        await page.emulate_media(media="print")
-        
-        pdf_bytes = await page.pdf(
-            format="A4",
-            print_background=True,
-            margin={"top": "0.5in", "bottom": "0.5in", "left": "0.5in", "right": "0.5in"}
-        )
-        await browser.close()
-    return Response(content=pdf_bytes, media_type="application/pdf")
\ No newline at end of file
+    async def render_item(index: int, item: PdfBatchItem):
+        async with semaphore:
+            try:
+                return index, await render_report_pdf(item.data, item.template, renderer=item.renderer or PDF_RENDERER), None
+            except Exception as e:
+                logger.error("Error renderizando un PDF del lote", extra={"index": index, "template": item.template, "error": str(e)})
+                return index, None, str(e)
+
+    async def zip_stream():
+        tasks = [asyncio.create_task(render_item(i, item)) for i, item in enumerate(batch.items)]
+        writer = _ZipChunkWriter()
+        manifest = []
+        try:
+            with zipfile.ZipFile(writer, mode="w", compression=zipfile.ZIP_STORED) as zf:
+                for next_done in asyncio.as_completed(tasks):
+                    index, pdf_bytes, error = await next_done
+                    item = batch.items[index]
+                    entry = {"index": index, "template": item.template}
+                    if error is None:
+                        entry.update(status="ok", file=_batch_filename(index, item))
+                        zf.writestr(entry["file"], pdf_bytes)
+                    else:
+                        entry.update(status="error", error=error)
+                    manifest.append(entry)
+                    yield writer.drain()
+                manifest.sort(key=lambda e: e["index"])
+                zf.writestr("manifest.json", json.dumps(manifest, ensure_ascii=False, indent=2))
+            yield writer.drain()
+        finally:
+            # Si el cliente corta la descarga, no seguimos renderizando para nadie.
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(
+        zip_stream(),
+        media_type="application/zip",
+        headers={"Content-Disposition": 'attachment; filename="informes.zip"'},
+    )
+
+
+startup_report.mark_imported()
@@ -0,0 +1,301 @@
+# benchmarks/fake_openai.py
+#
+# Servidor local que imita las partes de la API de OpenAI que usa el proyecto, con latencia
+# configurable, para medir la API sin gastar tokens ni depender de la red:
+#
+#   - Assistants: retrieve, threads, messages, runs en streaming, submit_tool_outputs en streaming y cancel.
+#   - Chat Completions: el plan de búsquedas del planificador (tool call `generate_search_plan`) y,
+#     en streaming, el Director del motor "chat" (tool call `run_multi_agent_research` y luego el informe).
+#   - Responses: las búsquedas web del `search_agent` (Agents SDK).
+#
+# Uso:
+#   python benchmarks/fake_openai.py --port 8100 --latency threads=0.05,runs=0.8,chat=0.6,search=1.5 --jitter 0.25
+#
+# y arrancar la API con OPENAI_BASE_URL=http://127.0.0.1:8100/v1.
+
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+DEFAULT_LATENCY = {"threads": 0.05, "runs": 0.8, "chat": 0.6, "search": 1.5}
+
+app = FastAPI()
+app.state.latency = dict(DEFAULT_LATENCY)
+app.state.jitter = 0.25
+app.state.topics = 3
+app.state.straggler_rate = 0.0
+app.state.straggler_factor = 10.0
+
+
+async def _delay(kind: str):
+    base = app.state.latency.get(kind, 0.0)
+    if base > 0:
+        delay = base * (1 + random.uniform(-app.state.jitter, app.state.jitter))
+        # Una fracción de las llamadas se atasca, para medir colas largas (p99) y el hedging.
+        if random.random() < app.state.straggler_rate:
+            delay *= app.state.straggler_factor
+        await asyncio.sleep(max(0.0, delay))
+
+
+def _new_id(prefix: str) -> str:
+    return f"{prefix}_{uuid.uuid4().hex[:24]}"
+
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _fake_city(name: str, roi: float) -> dict:
+    return {
+        "name": name,
+        "main_venue": f"Estadio Municipal de {name}",
+        "logistics": {"main_venue": f"Palacio de Congresos de {name}"},
+        "kpi_main": {"roi_est": roi, "legacy_score": 7, "sponsorship_potential": 8, "sea_impact_score": 64},
+        "kpi_economic": {"direct_impact_eur": 1250000, "adr_eur": 135, "budget_fit_percent": 92},
+        "kpi_sponsorship": {"media_value_eur": 480000},
+        "kpi": {"roi_est": roi, "adr_eur": 135, "venue_capacity": 2500, "co2_kg": 18000},
+    }
+
+
+def fake_report() -> dict:
+    return {
+        "event": {"name": "Evento de prueba"},
+        "summary": "Resumen ejecutivo generado por el servidor de pruebas. " * 8,
+        "recommendations": {
+            "recommended": _fake_city("Valencia", 3.4),
+            "alternatives": [_fake_city("Sevilla", 2.9), _fake_city("Bilbao", 2.6)],
+        },
+    }
+
+
+# --- Assistants ---
+
+DIRECTOR_INSTRUCTIONS = "Eres el Director de análisis de eventos del servidor de pruebas. " * 40
+DIRECTOR_TOOLS = [{"type": "function", "function": {
+    "name": "run_multi_agent_research",
+    "description": "Investiga en la web una lista de temas.",
+    "parameters": {"type": "object", "properties": {"topics": {"type": "array", "items": {"type": "string"}}}, "required": ["topics"]},
+}}]
+
+
+def _director_tool_call() -> dict:
+    topics = [f"Tema de investigación {i + 1}" for i in range(app.state.topics)]
+    return {"id": _new_id("call"), "type": "function",
+            "function": {"name": "run_multi_agent_research", "arguments": json.dumps({"topics": topics})}}
+
+
+@app.get("/v1/assistants/{assistant_id}")
+async def retrieve_assistant(assistant_id: str):
+    await _delay("threads")
+    return {
+        "id": assistant_id, "object": "assistant", "created_at": int(time.time()), "name": "Director (fake)",
+        "description": None, "model": "gpt-4o", "instructions": DIRECTOR_INSTRUCTIONS, "tools": DIRECTOR_TOOLS,
+        "metadata": {}, "temperature": 1.0, "top_p": 1.0, "response_format": "auto", "tool_resources": None,
+    }
+
+def _run_object(thread_id: str, run_id: str, status: str, required_action=None) -> dict:
+    return {
+        "id": run_id, "object": "thread.run", "created_at": int(time.time()), "assistant_id": "asst_bench",
+        "thread_id": thread_id, "status": status, "required_action": required_action, "last_error": None,
+        "expires_at": None, "started_at": None, "cancelled_at": None, "failed_at": None, "completed_at": None,
+        "incomplete_details": None, "model": "gpt-4o", "instructions": "", "tools": [], "metadata": {},
+        "usage": None, "temperature": 1.0, "top_p": 1.0, "max_prompt_tokens": None, "max_completion_tokens": None,
+        "truncation_strategy": {"type": "auto", "last_messages": None}, "response_format": "auto",
+        "tool_choice": "auto", "parallel_tool_calls": True,
+    }
+
+
+def _message_object(thread_id: str, message_id: str, text: str, status: str, run_id: str | None = None, role: str = "assistant") -> dict:
+    content = [{"type": "text", "text": {"value": text, "annotations": []}}] if text else []
+    return {
+        "id": message_id, "object": "thread.message", "created_at": int(time.time()), "thread_id": thread_id,
+        "role": role, "content": content, "assistant_id": "asst_bench" if role == "assistant" else None,
+        "run_id": run_id, "attachments": [], "metadata": {}, "status": status,
+        "incomplete_details": None, "completed_at": None, "incomplete_at": None,
+    }
+
+
+@app.post("/v1/threads")
+async def create_thread():
+    await _delay("threads")
+    return {"id": _new_id("thread"), "object": "thread", "created_at": int(time.time()), "metadata": {}, "tool_resources": None}
+
+
+@app.post("/v1/threads/{thread_id}/messages")
+async def create_message(thread_id: str, request: Request):
+    await _delay("threads")
+    body = await request.json()
+    return _message_object(thread_id, _new_id("msg"), str(body.get("content", "")), "completed", role="user")
+
+
+@app.get("/v1/threads/{thread_id}/messages")
+async def list_messages(thread_id: str):
+    await _delay("threads")
+    message = _message_object(thread_id, _new_id("msg"), json.dumps(fake_report(), ensure_ascii=False), "completed")
+    return {"object": "list", "data": [message], "first_id": message["id"], "last_id": message["id"], "has_more": False}
+
+
+@app.post("/v1/threads/{thread_id}/runs")
+async def create_run(thread_id: str):
+    run_id = _new_id("run")
+    required_action = {"type": "submit_tool_outputs", "submit_tool_outputs": {"tool_calls": [_director_tool_call()]}}
+
+    async def events():
+        yield _sse("thread.run.created", _run_object(thread_id, run_id, "queued"))
+        yield _sse("thread.run.queued", _run_object(thread_id, run_id, "queued"))
+        yield _sse("thread.run.in_progress", _run_object(thread_id, run_id, "in_progress"))
+        await _delay("runs")
+        yield _sse("thread.run.requires_action", _run_object(thread_id, run_id, "requires_action", required_action))
+        yield "event: done\ndata: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.post("/v1/threads/{thread_id}/runs/{run_id}/submit_tool_outputs")
+async def submit_tool_outputs(thread_id: str, run_id: str):
+    message_id = _new_id("msg")
+    text = json.dumps(fake_report(), ensure_ascii=False)
+    chunk_size = max(1, len(text) // 20)
+
+    async def events():
+        yield _sse("thread.run.in_progress", _run_object(thread_id, run_id, "in_progress"))
+        await _delay("runs")
+        yield _sse("thread.message.created", _message_object(thread_id, message_id, "", "in_progress", run_id))
+        for start in range(0, len(text), chunk_size):
+            delta = {"content": [{"index": 0, "type": "text", "text": {"value": text[start:start + chunk_size], "annotations": []}}]}
+            yield _sse("thread.message.delta", {"id": message_id, "object": "thread.message.delta", "delta": delta})
+            await asyncio.sleep(0)
+        yield _sse("thread.message.completed", _message_object(thread_id, message_id, text, "completed", run_id))
+        yield _sse("thread.run.completed", _run_object(thread_id, run_id, "completed"))
+        yield "event: done\ndata: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.post("/v1/threads/{thread_id}/runs/{run_id}/cancel")
+async def cancel_run(thread_id: str, run_id: str):
+    return _run_object(thread_id, run_id, "cancelling")
+
+
+# --- Chat Completions (planificador y Director del motor "chat") ---
+
+# Prefijos de prompt ya vistos, para simular la caché de prompts de OpenAI en el `usage`.
+_seen_prefixes: set[str] = set()
+
+
+def _chat_chunk(chunk_id: str, model: str, delta: dict, finish_reason: str | None = None) -> str:
+    chunk = {"id": chunk_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+             "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason, "logprobs": None}]}
+    return f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+
+
+def _director_stream(body: dict) -> StreamingResponse:
+    chunk_id, model = _new_id("chatcmpl"), body.get("model")
+    messages = body["messages"]
+    prefix = json.dumps([messages[0], body.get("tools")], sort_keys=True)
+    prompt_tokens = len(json.dumps(messages)) // 4
+    cached_tokens = len(prefix) // 4 if prefix in _seen_prefixes else 0
+    _seen_prefixes.add(prefix)
+
+    async def events():
+        await _delay("runs")
+        if messages[-1]["role"] != "tool":
+            tool_call = _director_tool_call()
+            name, arguments = tool_call["function"]["name"], tool_call["function"]["arguments"]
+            first = {"index": 0, "id": tool_call["id"], "type": "function", "function": {"name": name, "arguments": ""}}
+            yield _chat_chunk(chunk_id, model, {"role": "assistant", "content": None, "tool_calls": [first]})
+            for start in range(0, len(arguments), 16):
+                yield _chat_chunk(chunk_id, model, {"tool_calls": [{"index": 0, "function": {"arguments": arguments[start:start + 16]}}]})
+            yield _chat_chunk(chunk_id, model, {}, "tool_calls")
+            completion_tokens = len(arguments) // 4
+        else:
+            text = json.dumps(fake_report(), ensure_ascii=False)
+            chunk_size = max(1, len(text) // 20)
+            yield _chat_chunk(chunk_id, model, {"role": "assistant", "content": ""})
+            for start in range(0, len(text), chunk_size):
+                yield _chat_chunk(chunk_id, model, {"content": text[start:start + chunk_size]})
+                await asyncio.sleep(0)
+            yield _chat_chunk(chunk_id, model, {}, "stop")
+            completion_tokens = len(text) // 4
+        if (body.get("stream_options") or {}).get("include_usage"):
+            usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                     "total_tokens": prompt_tokens + completion_tokens, "prompt_tokens_details": {"cached_tokens": cached_tokens}}
+            yield f"data: {json.dumps({'id': chunk_id, 'object': 'chat.completion.chunk', 'created': int(time.time()), 'model': model, 'choices': [], 'usage': usage})}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    if body.get("stream"):
+        return _director_stream(body)
+    await _delay("chat")
+    topic = body["messages"][-1]["content"]
+    searches = [{"query": f"{topic} — búsqueda {i + 1}"} for i in range(5)]
+    return {
+        "id": _new_id("chatcmpl"), "object": "chat.completion", "created": int(time.time()), "model": body.get("model"),
+        "choices": [{"index": 0, "finish_reason": "tool_calls", "logprobs": None, "message": {
+            "role": "assistant", "content": None, "refusal": None,
+            "tool_calls": [{"id": _new_id("call"), "type": "function", "function": {
+                "name": "generate_search_plan", "arguments": json.dumps({"searches": searches}, ensure_ascii=False)}}],
+        }}],
+        "usage": {"prompt_tokens": 120, "completion_tokens": 80, "total_tokens": 200},
+    }
+
+
+# --- Responses (búsquedas web del Agents SDK) ---
+
+@app.post("/v1/responses")
+async def responses(request: Request):
+    body = await request.json()
+    await _delay("search")
+    text = "Resumen de prueba: " + ("datos relevantes sobre la búsqueda solicitada. " * 12)
+    return {
+        "id": _new_id("resp"), "object": "response", "created_at": int(time.time()), "model": body.get("model"),
+        "status": "completed", "error": None, "incomplete_details": None, "instructions": body.get("instructions"),
+        "output": [{"type": "message", "id": _new_id("msg"), "role": "assistant", "status": "completed",
+                    "content": [{"type": "output_text", "text": text, "annotations": []}]}],
+        "parallel_tool_calls": True, "tool_choice": "auto", "tools": [], "temperature": 1.0, "top_p": 1.0,
+        "usage": {"input_tokens": 900, "output_tokens": 250, "total_tokens": 1150,
+                  "input_tokens_details": {"cached_tokens": 0}, "output_tokens_details": {"reasoning_tokens": 0}},
+    }
+
+
+def parse_latency(spec: str) -> dict:
+    latency = dict(DEFAULT_LATENCY)
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        kind, _, seconds = part.partition("=")
+        latency[kind.strip()] = float(seconds)
+    return latency
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor local que imita la API de OpenAI para benchmarks.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency", default="", help="Latencia base por tipo, p. ej. 'threads=0.05,runs=0.8,chat=0.6,search=1.5'")
+    parser.add_argument("--jitter", type=float, default=0.25, help="Variación relativa de la latencia (0.25 = ±25%%)")
+    parser.add_argument("--topics", type=int, default=3, help="Temas que pide investigar el Director falso")
+    parser.add_argument("--straggler-rate", type=float, default=0.0, help="Fracción de llamadas que se atascan")
+    parser.add_argument("--straggler-factor", type=float, default=10.0, help="Multiplicador de latencia de las llamadas atascadas")
+    args = parser.parse_args()
+
+    app.state.latency = parse_latency(args.latency)
+    app.state.jitter = args.jitter
+    app.state.topics = args.topics
+    app.state.straggler_rate = args.straggler_rate
+    app.state.straggler_factor = args.straggler_factor
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
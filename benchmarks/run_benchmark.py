@@ -0,0 +1,286 @@
+# benchmarks/run_benchmark.py
+#
+# Benchmark de extremo a extremo sin llamar a OpenAI: arranca el servidor falso
+# (`benchmarks/fake_openai.py`) y la API apuntando a él, lanza carga concurrente contra
+# `/analyze-stream`, `/generate-pdf` y `/generate-pdf-mice`, y resume latencias p50/p95/p99,
+# throughput y memoria máxima (RSS) del proceso de la API.
+#
+# Dependencias propias del benchmark (además de las de la API): `pip install -r benchmarks/requirements.txt`.
+#
+# Uso (desde la raíz del repositorio):
+#   python benchmarks/run_benchmark.py --analyses 20 --analysis-concurrency 5 --pdfs 50 --pdf-concurrency 8
+#   python benchmarks/run_benchmark.py --json resultados.json   # para comparar entre despliegues
+#
+# Por defecto se desactivan las cachés (investigación, resultados y PDFs) para medir el camino
+# completo; `--with-caches` las deja activas.
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+import httpx
+
+from fake_openai import fake_report
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(values: list[float], p: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * p / 100
+    low = int(k)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (k - low)
+
+
+def summarize(latencies: list[float], errors: int, elapsed: float) -> dict:
+    return {
+        "requests": len(latencies) + errors,
+        "ok": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 3) if elapsed > 0 else None,
+        **{f"p{p}_ms": None if (v := percentile(latencies, p)) is None else round(v * 1000, 1) for p in (50, 95, 99)},
+    }
+
+
+def peak_rss_mb(pid: int) -> float | None:
+    """Memoria residente máxima (VmHWM) del proceso; solo disponible en Linux."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+# --- Procesos ---
+
+def start_process(args: list[str], env: dict, log_path: str) -> subprocess.Popen:
+    log = open(log_path, "wb")
+    return subprocess.Popen(args, cwd=REPO_DIR, env=env, stdout=log, stderr=subprocess.STDOUT, start_new_session=True)
+
+
+def stop_process(process: subprocess.Popen):
+    if process.poll() is None:
+        os.killpg(process.pid, signal.SIGTERM)
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            os.killpg(process.pid, signal.SIGKILL)
+
+
+async def wait_ready(url: str, process: subprocess.Popen, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"El proceso terminó antes de estar listo ({url})")
+            try:
+                if (await client.get(url)).status_code < 500:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"Tiempo de espera agotado esperando a {url}")
+
+
+# --- Carga ---
+
+def sample_event(i: int) -> dict:
+    # Cada evento es distinto para que la coalescencia de análisis no los junte.
+    return {
+        "sportType": "Pádel", "eventLevel": "Nacional", "mainFocus": "Turismo deportivo",
+        "startDate": "2027-05-10", "endDate": "2027-05-12", "attendeesMin": 500 + i, "attendeesMax": 2000,
+        "budget": 150000, "location": "España", "requirements": f"benchmark {uuid.uuid4().hex[:8]}",
+    }
+
+
+def sample_report(i: int, variant: str) -> dict:
+    report = fake_report()
+    report["event"]["name"] = f"Evento de prueba {variant} {i}"
+    return report
+
+
+async def run_load(total: int, concurrency: int, request_one) -> dict:
+    latencies: list[float] = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def worker(i: int):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                ok = await request_one(i)
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(total)))
+    return summarize(latencies, errors, time.perf_counter() - start)
+
+
+async def analysis_load(client: httpx.AsyncClient, total: int, concurrency: int) -> dict:
+    first_event: list[float] = []
+
+    async def one(i: int) -> bool:
+        start = time.perf_counter()
+        params = {"event_data_json": json.dumps(sample_event(i))}
+        got_final = False
+        first_seen = None
+        async with client.stream("GET", "/analyze-stream", params=params) as response:
+            if response.status_code != 200:
+                return False
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                if first_seen is None:
+                    first_seen = time.perf_counter() - start
+                    first_event.append(first_seen)
+                message = json.loads(line[5:].strip())
+                if message.get("type") == "error":
+                    return False
+                if message.get("type") == "final_result":
+                    got_final = True
+        return got_final
+
+    result = await run_load(total, concurrency, one)
+    result["p50_first_event_ms"] = None if (v := percentile(first_event, 50)) is None else round(v * 1000, 1)
+    return result
+
+
+async def pdf_load(client: httpx.AsyncClient, path: str, variant: str, total: int, concurrency: int) -> dict:
+    async def one(i: int) -> bool:
+        response = await client.post(path, json=sample_report(i, variant))
+        return response.status_code == 200 and response.content.startswith(b"%PDF")
+
+    return await run_load(total, concurrency, one)
+
+
+# --- Main ---
+
+async def main_async(args) -> dict:
+    workdir = tempfile.mkdtemp(prefix="mice-bench-")
+    fake_port, api_port = _free_port(), _free_port()
+    base_env = {k: v for k, v in os.environ.items() if not k.startswith(("OPENAI_", "LOGTAIL_"))}
+
+    fake = start_process(
+        [sys.executable, os.path.join(BENCH_DIR, "fake_openai.py"), "--port", str(fake_port),
+         "--latency", args.latency, "--jitter", str(args.jitter), "--topics", str(args.topics),
+         "--straggler-rate", str(args.straggler_rate), "--straggler-factor", str(args.straggler_factor)],
+        base_env, os.path.join(workdir, "fake_openai.log"),
+    )
+    api_env = {
+        **base_env,
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{fake_port}/v1",
+        "OPENAI_API_KEY": "bench",
+        "OPENAI_ASSISTANT_ID": "asst_bench",
+        "OPENAI_AGENTS_DISABLE_TRACING": "1",
+        "ANALYSIS_JOBS_DIR": os.path.join(workdir, "jobs"),
+        "ANALYSIS_MAX_CONCURRENT": str(args.analysis_concurrency),
+        "ANALYSIS_MAX_QUEUED": str(max(args.analyses, 1)),
+        "DIRECTOR_ENGINE": args.director_engine,
+    }
+    if args.with_caches:
+        api_env["RESEARCH_CACHE_PATH"] = os.path.join(workdir, "research_cache.sqlite3")
+    else:
+        api_env.update({"RESEARCH_CACHE_PATH": "", "ANALYSIS_RESULT_TTL": "0", "PDF_CACHE_MAX_MEMORY_MB": "0"})
+    api_spawned = time.perf_counter()
+    api = start_process(
+        [sys.executable, "-m", "uvicorn", "api:app", "--host", "127.0.0.1", "--port", str(api_port), "--log-level", "warning"],
+        api_env, os.path.join(workdir, "api.log"),
+    )
+
+    results = {"config": vars(args), "logs": workdir}
+    try:
+        await wait_ready(f"http://127.0.0.1:{fake_port}/docs", fake)
+        await wait_ready(f"http://127.0.0.1:{api_port}/healthz", api)
+        # Coste del arranque en frío: desde lanzar el proceso hasta que responde, y el desglose de la propia API.
+        results["api_ready_ms"] = round((time.perf_counter() - api_spawned) * 1000, 1)
+        async with httpx.AsyncClient() as probe:
+            results["api_startup"] = (await probe.get(f"http://127.0.0.1:{api_port}/startup")).json()
+        timeout = httpx.Timeout(args.timeout)
+        limits = httpx.Limits(max_connections=max(args.analysis_concurrency, args.pdf_concurrency) * 2)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{api_port}", timeout=timeout, limits=limits) as client:
+            if args.analyses:
+                results["analyze_stream"] = await analysis_load(client, args.analyses, args.analysis_concurrency)
+            if args.pdfs:
+                results["generate_pdf"] = await pdf_load(client, "/generate-pdf", "sports", args.pdfs, args.pdf_concurrency)
+                results["generate_pdf_mice"] = await pdf_load(client, "/generate-pdf-mice", "mice", args.pdfs, args.pdf_concurrency)
+        results["api_peak_rss_mb"] = peak_rss_mb(api.pid)
+    finally:
+        stop_process(api)
+        stop_process(fake)
+    return results
+
+
+def print_report(results: dict):
+    print(f"\nLogs de los procesos: {results['logs']}")
+    if "api_startup" in results:
+        startup = results["api_startup"]
+        print(f"\narranque: listo en {results['api_ready_ms']} ms desde el spawn  (import {startup['import_ms']} ms, listo {startup['ready_ms']} ms)")
+        print("  calentamiento: " + ", ".join(f"{name} {ms} ms" for name, ms in startup["warmup_ms"].items()))
+        if startup["warmup_errors"]:
+            for name, error in startup["warmup_errors"].items():
+                print(f"  error en {name}: {error.splitlines()[0]}")
+    for name in ("analyze_stream", "generate_pdf", "generate_pdf_mice"):
+        if name not in results:
+            continue
+        r = results[name]
+        print(f"\n{name}")
+        print(f"  peticiones: {r['requests']}  ok: {r['ok']}  errores: {r['errors']}  throughput: {r['throughput_rps']} req/s")
+        print(f"  p50: {r['p50_ms']} ms  p95: {r['p95_ms']} ms  p99: {r['p99_ms']} ms")
+        if "p50_first_event_ms" in r:
+            print(f"  p50 hasta el primer evento: {r['p50_first_event_ms']} ms")
+    print(f"\nRSS máximo de la API: {results.get('api_peak_rss_mb')} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la API contra un servidor falso de OpenAI.")
+    parser.add_argument("--analyses", type=int, default=10, help="Análisis a lanzar contra /analyze-stream")
+    parser.add_argument("--analysis-concurrency", type=int, default=4)
+    parser.add_argument("--pdfs", type=int, default=20, help="PDFs a generar por cada endpoint de PDF")
+    parser.add_argument("--pdf-concurrency", type=int, default=4)
+    parser.add_argument("--latency", default="", help="Latencia del servidor falso, p. ej. 'threads=0.05,runs=0.8,chat=0.6,search=1.5'")
+    parser.add_argument("--jitter", type=float, default=0.25)
+    parser.add_argument("--topics", type=int, default=3, help="Temas de investigación por análisis")
+    parser.add_argument("--straggler-rate", type=float, default=0.0, help="Fracción de llamadas falsas que se atascan")
+    parser.add_argument("--straggler-factor", type=float, default=10.0, help="Multiplicador de latencia de las llamadas atascadas")
+    parser.add_argument("--director-engine", choices=("assistant", "chat"), default="assistant", help="Motor del Director de la API")
+    parser.add_argument("--timeout", type=float, default=300, help="Timeout por petición (segundos)")
+    parser.add_argument("--with-caches", action="store_true", help="Mantiene activas las cachés de la API")
+    parser.add_argument("--json", help="Guarda los resultados en este fichero JSON")
+    args = parser.parse_args()
+
+    results = asyncio.run(main_async(args))
+    print_report(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
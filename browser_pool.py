@@ -0,0 +1,198 @@
+# browser_pool.py
+
+import asyncio
+from collections import Counter
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from logging_config import logger
+from metrics import track_phase
+
+
+def _playwright():
+    """Playwright se importa al lanzar Chromium por primera vez, no al importar la API."""
+    import playwright.async_api
+    return playwright.async_api
+
+
+async def _block_request(route):
+    await route.abort("blockedbyclient")
+
+
+class PdfPoolBusy(Exception):
+    """Se lanza cuando no hay una página libre dentro del tiempo de espera configurado."""
+
+
+@dataclass(eq=False)
+class _PageSlot:
+    browser: object
+    context: object
+    page: object
+    renders: int = 0
+
+
+class BrowserPool:
+    """
+    Un único Chromium compartido por todo el proceso y un pool acotado de páginas reutilizables.
+
+    - `max_concurrency` limita cuántos PDFs se renderizan a la vez; el resto espera en cola.
+    - Cada página (con su contexto) se recicla tras `page_max_renders` renders o si falla.
+    - El navegador se recicla tras `browser_max_renders` renders o si se cae.
+    """
+
+    def __init__(self, max_concurrency: int, page_max_renders: int, browser_max_renders: int, queue_timeout: float):
+        self.max_concurrency = max_concurrency
+        self.page_max_renders = page_max_renders
+        self.browser_max_renders = browser_max_renders
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._lock = asyncio.Lock()
+        self._playwright = None
+        self._browser = None
+        self._browser_renders = 0
+        self._idle: list[_PageSlot] = []
+        self._leases: Counter = Counter()
+        self._retiring: list = []
+
+    async def start(self):
+        async with self._lock:
+            await self._ensure_browser()
+
+    async def stop(self):
+        async with self._lock:
+            for slot in self._idle:
+                await self._close_slot(slot)
+            self._idle.clear()
+            for browser in [self._browser, *self._retiring]:
+                if browser is not None:
+                    await self._close_browser(browser)
+            self._browser = None
+            self._retiring.clear()
+            if self._playwright is not None:
+                await self._playwright.stop()
+                self._playwright = None
+
+    async def render_pdf(self, html: str, timings: dict | None = None, **pdf_options) -> bytes:
+        """
+        Renderiza `html` a PDF en una página del pool. Reintenta una vez si el navegador se ha caído.
+        Si se pasa `timings`, se rellena con los segundos de cada fase (cola, arranque, set_content, pdf).
+        """
+        for attempt in range(2):
+            async with self._lease(timings) as slot:
+                try:
+                    with track_phase("pdf_set_content", timings):
+                        await slot.page.set_content(html)
+                    with track_phase("pdf_print", timings):
+                        return await slot.page.pdf(**pdf_options)
+                except _playwright().Error:
+                    if attempt == 0 and not slot.browser.is_connected():
+                        logger.warning("Chromium se ha caído durante un render, reintentando con un navegador nuevo")
+                        continue
+                    raise
+
+    # --- Gestión interna de páginas y navegador ---
+
+    @asynccontextmanager
+    async def _lease(self, timings: dict | None = None):
+        try:
+            with track_phase("pdf_queue_wait", timings):
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise PdfPoolBusy(f"No hay páginas libres para renderizar tras {self.queue_timeout}s de espera")
+        try:
+            slot = await self._acquire_slot(timings)
+            failed = False
+            try:
+                yield slot
+            except BaseException:
+                failed = True
+                raise
+            finally:
+                await self._release_slot(slot, failed)
+        finally:
+            self._semaphore.release()
+
+    async def _acquire_slot(self, timings: dict | None = None) -> _PageSlot:
+        async with self._lock:
+            browser = await self._ensure_browser(timings)
+            while self._idle:
+                slot = self._idle.pop()
+                if slot.browser is browser and not slot.page.is_closed():
+                    self._leases[browser] += 1
+                    return slot
+                await self._close_slot(slot)
+            self._leases[browser] += 1
+        try:
+            with track_phase("pdf_page_setup", timings):
+                context = await browser.new_context()
+                # Todo lo que necesita el informe va incrustado en el HTML: cualquier petición saliente se bloquea.
+                await context.route("**/*", _block_request)
+                page = await context.new_page()
+                await page.emulate_media(media="print")
+        except BaseException:
+            async with self._lock:
+                self._leases[browser] -= 1
+            raise
+        return _PageSlot(browser=browser, context=context, page=page)
+
+    async def _release_slot(self, slot: _PageSlot, failed: bool):
+        async with self._lock:
+            slot.renders += 1
+            self._leases[slot.browser] -= 1
+            is_current = slot.browser is self._browser
+            if is_current:
+                self._browser_renders += 1
+
+            reusable = (
+                not failed
+                and is_current
+                and slot.browser.is_connected()
+                and slot.renders < self.page_max_renders
+            )
+            if reusable:
+                self._idle.append(slot)
+            else:
+                await self._close_slot(slot)
+
+            if is_current and self._browser_renders >= self.browser_max_renders:
+                logger.info("Reciclando Chromium", extra={"renders": self._browser_renders})
+                self._retiring.append(self._browser)
+                self._browser = None
+
+            for browser in list(self._retiring):
+                if self._leases[browser] <= 0:
+                    self._retiring.remove(browser)
+                    del self._leases[browser]
+                    await self._close_browser(browser)
+
+    async def _ensure_browser(self, timings: dict | None = None):
+        """Debe llamarse con `self._lock` adquirido. Lanza Chromium si no existe o si se ha caído."""
+        if self._browser is not None and self._browser.is_connected():
+            return self._browser
+        if self._browser is not None:
+            logger.warning("Chromium no responde, lanzando uno nuevo")
+            if self._leases[self._browser] > 0:
+                self._retiring.append(self._browser)
+            else:
+                del self._leases[self._browser]
+                await self._close_browser(self._browser)
+            self._browser = None
+        with track_phase("pdf_launch", timings):
+            if self._playwright is None:
+                self._playwright = await _playwright().async_playwright().start()
+            self._browser = await self._playwright.chromium.launch()
+        self._browser_renders = 0
+        return self._browser
+
+    @staticmethod
+    async def _close_slot(slot: _PageSlot):
+        try:
+            await slot.context.close()
+        except _playwright().Error:
+            pass
+
+    @staticmethod
+    async def _close_browser(browser):
+        try:
+            await browser.close()
+        except _playwright().Error:
+            pass
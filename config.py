@@ -1,11 +1,131 @@
 import os
 from dotenv import load_dotenv
-from openai import AsyncOpenAI
 
 load_dotenv()
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 ASSISTANT_ID = os.getenv("OPENAI_ASSISTANT_ID")
+# Permite apuntar a un servidor compatible (p. ej. el falso de `benchmarks/fake_openai.py`).
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
 
-openai_client = AsyncOpenAI(api_key=OPENAI_API_KEY, max_retries=2)
-RESEARCH_MODEL = "gpt-4o-mini"
\ No newline at end of file
+# --- Pool HTTP hacia OpenAI (uno solo para todo el proceso: Director, planificador y búsquedas) ---
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "100"))
+OPENAI_MAX_KEEPALIVE = int(os.getenv("OPENAI_MAX_KEEPALIVE", "50"))
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "120"))
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "600"))
+
+_openai_client = None
+
+def get_openai_client():
+    """
+    Cliente de OpenAI del proceso, creado en el primer uso (la API lo crea al arrancar): importar
+    `openai` cuesta casi un segundo y no hace falta para, p. ej., renderizar PDFs.
+    """
+    global _openai_client
+    if _openai_client is None:
+        from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DEFAULT_CONNECTION_LIMITS, DEFAULT_TIMEOUT
+        # `Limits` y `Timeout` se toman de la librería HTTP con la que viene el SDK instalado
+        # (httpx o httpx2, según la versión de `openai`) en vez de importarla por nuestra cuenta.
+        Limits, Timeout = type(DEFAULT_CONNECTION_LIMITS), type(DEFAULT_TIMEOUT)
+        _openai_client = AsyncOpenAI(
+            api_key=OPENAI_API_KEY,
+            base_url=OPENAI_BASE_URL,
+            max_retries=2,
+            http_client=DefaultAsyncHttpxClient(
+                limits=Limits(
+                    max_connections=OPENAI_MAX_CONNECTIONS,
+                    max_keepalive_connections=OPENAI_MAX_KEEPALIVE,
+                    keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY,
+                ),
+                timeout=Timeout(OPENAI_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT),
+            ),
+        )
+    return _openai_client
+
+async def close_openai_client():
+    global _openai_client
+    if _openai_client is not None:
+        await _openai_client.close()
+        _openai_client = None
+
+RESEARCH_MODEL = "gpt-4o-mini"
+SEARCH_MODEL = "gpt-4o-mini"
+
+# --- Motor del Director ---
+# "assistant": Assistants API (thread, mensaje, run en streaming). "chat": la misma conversación con
+# Chat Completions, sin estado en el servidor; las instrucciones y herramientas se leen una vez del Assistant.
+DIRECTOR_ENGINE = os.getenv("DIRECTOR_ENGINE", "assistant")
+# Modelo del motor "chat" (vacío = el que tenga configurado el Assistant).
+DIRECTOR_MODEL = os.getenv("DIRECTOR_MODEL", "")
+DIRECTOR_MAX_TURNS = int(os.getenv("DIRECTOR_MAX_TURNS", "8"))
+# Clave de enrutado para la caché de prompts de OpenAI (vacío = no se envía).
+DIRECTOR_PROMPT_CACHE_KEY = os.getenv("DIRECTOR_PROMPT_CACHE_KEY", "mice-director")
+
+# --- Pool de Chromium para la generación de PDFs ---
+PDF_MAX_CONCURRENCY = int(os.getenv("PDF_MAX_CONCURRENCY", "4"))
+PDF_PAGE_MAX_RENDERS = int(os.getenv("PDF_PAGE_MAX_RENDERS", "50"))
+PDF_BROWSER_MAX_RENDERS = int(os.getenv("PDF_BROWSER_MAX_RENDERS", "500"))
+PDF_QUEUE_TIMEOUT = float(os.getenv("PDF_QUEUE_TIMEOUT", "30"))
+# Renderizador por defecto: "chromium" (plantillas HTML) o "fast" (Python puro, sin navegador).
+# Cada petición puede elegir otro con `?renderer=`.
+PDF_RENDERER = os.getenv("PDF_RENDERER", "chromium")
+
+# --- Caché de PDFs (PDF_CACHE_DIR vacío = solo memoria) ---
+PDF_CACHE_MAX_MEMORY_MB = int(os.getenv("PDF_CACHE_MAX_MEMORY_MB", "64"))
+PDF_CACHE_DIR = os.getenv("PDF_CACHE_DIR", "")
+PDF_CACHE_MAX_DISK_MB = int(os.getenv("PDF_CACHE_MAX_DISK_MB", "512"))
+PDF_BATCH_MAX_ITEMS = int(os.getenv("PDF_BATCH_MAX_ITEMS", "100"))
+
+# --- Informes terminados y sus PDFs especulativos (PDF_PRERENDER_VARIANTS vacío = sin render anticipado) ---
+PDF_PRERENDER_VARIANTS = [v.strip() for v in os.getenv("PDF_PRERENDER_VARIANTS", "sports,mice").split(",") if v.strip()]
+PDF_PRERENDER_CONCURRENCY = int(os.getenv("PDF_PRERENDER_CONCURRENCY", "2"))
+REPORT_RETENTION = float(os.getenv("REPORT_RETENTION", "3600"))
+REPORT_MAX_ENTRIES = int(os.getenv("REPORT_MAX_ENTRIES", "256"))
+
+# --- Caché persistente de investigación (RESEARCH_CACHE_PATH vacío = desactivada) ---
+RESEARCH_CACHE_PATH = os.getenv("RESEARCH_CACHE_PATH", "research_cache.sqlite3")
+RESEARCH_CACHE_PLAN_TTL = float(os.getenv("RESEARCH_CACHE_PLAN_TTL", str(7 * 24 * 3600)))
+RESEARCH_CACHE_SEARCH_TTL = float(os.getenv("RESEARCH_CACHE_SEARCH_TTL", str(24 * 3600)))
+RESEARCH_CACHE_MAX_ENTRIES = int(os.getenv("RESEARCH_CACHE_MAX_ENTRIES", "5000"))
+
+# --- Límites de OpenAI para el planificador global de llamadas ---
+OPENAI_RPM_LIMIT = int(os.getenv("OPENAI_RPM_LIMIT", "500"))
+OPENAI_TPM_LIMIT = int(os.getenv("OPENAI_TPM_LIMIT", "200000"))
+# Lo que se cobra del cupo TPM al admitir cada llamada; al terminar se corrige con el `usage` real,
+# así que solo limitan cuántas llamadas arrancan a la vez: mejor algo por encima que por debajo.
+PLANNER_TOKEN_ESTIMATE = int(os.getenv("PLANNER_TOKEN_ESTIMATE", "1000"))
+SEARCH_TOKEN_ESTIMATE = int(os.getenv("SEARCH_TOKEN_ESTIMATE", "4000"))
+
+# --- Compactación del informe de investigación (umbral > 1 = sin casi duplicados, presupuesto 0 = sin límite) ---
+RESEARCH_DEDUP_THRESHOLD = float(os.getenv("RESEARCH_DEDUP_THRESHOLD", "0.7"))
+RESEARCH_TOKEN_BUDGET = int(os.getenv("RESEARCH_TOKEN_BUDGET", "0"))
+
+# --- Búsquedas con plazo, hedging y quórum ---
+# Plazo por búsqueda en segundos (0 = sin plazo). Pasado el plazo, la búsqueda se descarta.
+RESEARCH_SEARCH_DEADLINE = float(os.getenv("RESEARCH_SEARCH_DEADLINE", "90"))
+# Se lanza una búsqueda duplicada si la primera supera este percentil de latencia (0 = sin hedging),
+# con un mínimo de muestras para estimarlo y un retraso mínimo.
+RESEARCH_HEDGE_PERCENTILE = float(os.getenv("RESEARCH_HEDGE_PERCENTILE", "95"))
+RESEARCH_HEDGE_MIN_SAMPLES = int(os.getenv("RESEARCH_HEDGE_MIN_SAMPLES", "20"))
+RESEARCH_HEDGE_MIN_DELAY = float(os.getenv("RESEARCH_HEDGE_MIN_DELAY", "3"))
+# Fracción de búsquedas de un tema que bastan para darlo por terminado (1 = esperar a todas).
+RESEARCH_SEARCH_QUORUM = float(os.getenv("RESEARCH_SEARCH_QUORUM", "1"))
+
+# --- Resultados de análisis recientes (ANALYSIS_RESULT_TTL=0 desactiva la caché) ---
+ANALYSIS_RESULT_TTL = float(os.getenv("ANALYSIS_RESULT_TTL", "600"))
+ANALYSIS_RESULT_MAX_ENTRIES = int(os.getenv("ANALYSIS_RESULT_MAX_ENTRIES", "256"))
+
+# --- Trabajos de análisis reanudables (ANALYSIS_JOBS_DIR vacío = solo en memoria) ---
+ANALYSIS_JOB_RETENTION = float(os.getenv("ANALYSIS_JOB_RETENTION", "3600"))
+ANALYSIS_JOBS_DIR = os.getenv("ANALYSIS_JOBS_DIR", "")
+
+# --- Control de admisión y cancelación de análisis ---
+ANALYSIS_MAX_CONCURRENT = int(os.getenv("ANALYSIS_MAX_CONCURRENT", "4"))
+ANALYSIS_MAX_QUEUED = int(os.getenv("ANALYSIS_MAX_QUEUED", "16"))
+ANALYSIS_MAX_EVENTS = int(os.getenv("ANALYSIS_MAX_EVENTS", "2000"))
+ANALYSIS_CANCEL_GRACE = float(os.getenv("ANALYSIS_CANCEL_GRACE", "15"))
+
+# --- Análisis en lote (/analyze-bulk) ---
+ANALYSIS_BULK_MAX_EVENTS = int(os.getenv("ANALYSIS_BULK_MAX_EVENTS", "50"))
+ANALYSIS_BULK_CONCURRENCY = int(os.getenv("ANALYSIS_BULK_CONCURRENCY", "4"))
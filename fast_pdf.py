@@ -0,0 +1,317 @@
+# fast_pdf.py
+
+import unicodedata
+import zlib
+from report_templates import sports_kpis, mice_kpis, MICE_RECOMMENDED_STYLE, MICE_ALTERNATIVE_STYLE
+
+# Renderizador de PDF en Python puro, sin navegador. Dibuja los mismos bloques que las plantillas
+# HTML (resumen, sede recomendada, alternativas y KPIs) con las fuentes estándar de PDF
+# (Helvetica), así que no necesita Chromium ni ficheros de fuentes: un informe normal se genera
+# en milisegundos y con muy poca memoria. A cambio, la maquetación es más sencilla y los emojis
+# de las plantillas HTML se omiten (Helvetica solo cubre WinAnsi).
+
+PAGE_WIDTH, PAGE_HEIGHT = 595.28, 841.89  # A4 en puntos
+
+# Anchos de glifo (1/1000 em) de Helvetica y Helvetica-Bold para ASCII 32..126, según sus AFM.
+# Las letras acentuadas miden lo mismo que su letra base.
+_HELVETICA_WIDTHS = (
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+)
+_HELVETICA_BOLD_WIDTHS = (
+    278, 333, 474, 556, 556, 889, 722, 238, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 333, 333, 584, 584, 584, 611,
+    975, 722, 722, 722, 722, 667, 611, 778, 722, 278, 556, 722, 611, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 333, 278, 333, 584, 556,
+    333, 556, 611, 556, 611, 556, 333, 611, 611, 278, 278, 556, 278, 889, 611, 611,
+    611, 611, 389, 556, 333, 611, 556, 778, 556, 556, 500, 389, 280, 389, 584,
+)
+_EXTRA_WIDTHS = {"€": 556, "¿": 611, "¡": 333, "º": 365, "ª": 370, "·": 278, "–": 556, "—": 1000, "…": 1000,
+                 "•": 350, "“": 333, "”": 333, "‘": 222, "’": 222, "«": 556, "»": 556, "×": 584}
+
+FONTS = {
+    "regular": ("F1", "Helvetica", _HELVETICA_WIDTHS),
+    "bold": ("F2", "Helvetica-Bold", _HELVETICA_BOLD_WIDTHS),
+}
+
+
+def clean_text(text) -> str:
+    """Deja solo caracteres representables en WinAnsi (cp1252); `CO₂` pasa a `CO2` y los emojis se omiten."""
+    text = unicodedata.normalize("NFKC", str(text))
+    kept = []
+    for ch in text:
+        try:
+            ch.encode("cp1252")
+            kept.append(ch)
+        except UnicodeEncodeError:
+            continue
+    return " ".join("".join(kept).split())
+
+
+def _char_width(ch: str, widths: tuple) -> int:
+    code = ord(ch)
+    if 32 <= code <= 126:
+        return widths[code - 32]
+    if ch in _EXTRA_WIDTHS:
+        return _EXTRA_WIDTHS[ch]
+    base = unicodedata.normalize("NFKD", ch)[0]
+    if 32 <= ord(base) <= 126:
+        return widths[ord(base) - 32]
+    return 556
+
+
+def text_width(text: str, font: str, size: float) -> float:
+    widths = FONTS[font][2]
+    return sum(_char_width(ch, widths) for ch in text) * size / 1000
+
+
+def wrap_text(text: str, font: str, size: float, max_width: float) -> list[str]:
+    lines, current = [], ""
+    for word in text.split():
+        candidate = f"{current} {word}" if current else word
+        if current and text_width(candidate, font, size) > max_width:
+            lines.append(current)
+            current = word
+        else:
+            current = candidate
+    if current:
+        lines.append(current)
+    return lines or [""]
+
+
+def _hex_to_rgb(color: str) -> tuple[float, float, float]:
+    color = color.lstrip("#")
+    return tuple(int(color[i:i + 2], 16) / 255 for i in (0, 2, 4))
+
+
+def _pdf_string(text: str) -> str:
+    encoded = text.encode("cp1252", errors="replace").decode("latin-1")
+    return "(" + encoded.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") + ")"
+
+
+class PdfCanvas:
+    """
+    Documento PDF mínimo con coordenadas desde arriba (como en HTML): `y` crece hacia abajo.
+    Solo sabe pintar rectángulos, líneas y texto con Helvetica, que es todo lo que usan los informes.
+    """
+
+    def __init__(self, background: str | None = None):
+        self.background = background
+        self.pages: list[list[str]] = []
+        self.new_page()
+
+    def new_page(self):
+        self.pages.append([])
+        if self.background:
+            self.rect(0, 0, PAGE_WIDTH, PAGE_HEIGHT, fill=self.background)
+
+    def rect(self, x: float, y: float, width: float, height: float, fill: str | None = None, stroke: str | None = None):
+        ops = []
+        if fill:
+            ops.append("%.3f %.3f %.3f rg" % _hex_to_rgb(fill))
+        if stroke:
+            ops.append("%.3f %.3f %.3f RG 0.75 w" % _hex_to_rgb(stroke))
+        paint = "B" if fill and stroke else ("f" if fill else "S")
+        ops.append(f"{x:.2f} {PAGE_HEIGHT - y - height:.2f} {width:.2f} {height:.2f} re {paint}")
+        self.pages[-1].append(" ".join(ops))
+
+    def line(self, x1: float, y1: float, x2: float, y2: float, color: str, width: float = 0.75):
+        r, g, b = _hex_to_rgb(color)
+        self.pages[-1].append(
+            f"{r:.3f} {g:.3f} {b:.3f} RG {width:.2f} w {x1:.2f} {PAGE_HEIGHT - y1:.2f} m {x2:.2f} {PAGE_HEIGHT - y2:.2f} l S")
+
+    def text(self, x: float, y: float, text: str, font: str = "regular", size: float = 12, color: str = "#000000"):
+        """Escribe `text` con la línea base en `y`."""
+        r, g, b = _hex_to_rgb(color)
+        name = FONTS[font][0]
+        self.pages[-1].append(
+            f"BT {r:.3f} {g:.3f} {b:.3f} rg /{name} {size:.2f} Tf {x:.2f} {PAGE_HEIGHT - y:.2f} Td {_pdf_string(text)} Tj ET")
+
+    def to_bytes(self) -> bytes:
+        objects: list[bytes] = []
+
+        def add(body: bytes) -> int:
+            objects.append(body)
+            return len(objects)
+
+        catalog_id = add(b"")
+        pages_id = add(b"")
+        font_ids = {
+            name: add(f"<< /Type /Font /Subtype /Type1 /BaseFont /{base} /Encoding /WinAnsiEncoding >>".encode())
+            for name, base, _ in FONTS.values()
+        }
+        resources = "<< /Font << " + " ".join(f"/{name} {obj} 0 R" for name, obj in font_ids.items()) + " >> >>"
+        page_ids = []
+        for ops in self.pages:
+            stream = zlib.compress("\n".join(ops).encode("latin-1"))
+            content_id = add(b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(stream) + stream + b"\nendstream")
+            page_ids.append(add(
+                f"<< /Type /Page /Parent {pages_id} 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+                f"/Resources {resources} /Contents {content_id} 0 R >>".encode()))
+        objects[catalog_id - 1] = f"<< /Type /Catalog /Pages {pages_id} 0 R >>".encode()
+        kids = " ".join(f"{page_id} 0 R" for page_id in page_ids)
+        objects[pages_id - 1] = f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>".encode()
+
+        out = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(len(out))
+            out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+        xref_offset = len(out)
+        out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+        out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+        out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog_id, xref_offset)
+        return bytes(out)
+
+
+class _ReportLayout:
+    """Apila bloques verticalmente y salta de página cuando un bloque no cabe."""
+
+    def __init__(self, canvas: PdfCanvas, margin: float):
+        self.canvas = canvas
+        self.margin = margin
+        self.width = PAGE_WIDTH - 2 * margin
+        self.y = margin
+
+    def ensure_space(self, height: float):
+        if self.y + height > PAGE_HEIGHT - self.margin and self.y > self.margin:
+            self.canvas.new_page()
+            self.y = self.margin
+
+    def paragraph_lines(self, text: str, size: float, padding: float) -> list[str]:
+        return wrap_text(clean_text(text), "regular", size, self.width - 2 * padding)
+
+
+def _summary_cards(layout: _ReportLayout, summary: str, theme: dict, title_size: float, header_h: float, gap: float):
+    """Tarjeta de resumen ejecutivo. Si el texto no cabe en la página, continúa en otra tarjeta en la siguiente."""
+    c, pad, size, leading = layout.canvas, 15, 10.5, 17
+    lines = layout.paragraph_lines(summary, size, pad)
+    while lines:
+        layout.ensure_space(header_h + leading + 2 * pad)
+        available = PAGE_HEIGHT - layout.margin - layout.y - header_h - 2 * pad
+        take = max(1, int(available // leading))
+        chunk, lines = lines[:take], lines[take:]
+        height = header_h + len(chunk) * leading + 2 * pad
+        c.rect(layout.margin, layout.y, layout.width, height, fill=theme["card"], stroke=theme["border"])
+        c.text(layout.margin + pad, layout.y + header_h * 0.65, "Resumen Ejecutivo", "bold", title_size, theme["heading"])
+        c.line(layout.margin, layout.y + header_h, layout.margin + layout.width, layout.y + header_h, theme["border"])
+        for i, line in enumerate(chunk):
+            c.text(layout.margin + pad, layout.y + header_h + pad + (i + 1) * leading - 4, line, "regular", size, theme["summary"])
+        layout.y += height + gap
+
+
+# --- Informe de eventos deportivos (tema oscuro, como report_sports.css) ---
+
+_SPORTS = {"bg": "#1a1d24", "card": "#2c303a", "border": "#4a5568", "white": "#ffffff", "heading": "#ffffff",
+           "secondary": "#94a3b8", "summary": "#94a3b8", "green": "#10B981", "blue": "#3B82F6"}
+
+
+def _sports_city(layout: _ReportLayout, city: dict, is_recommended: bool):
+    c, pad = layout.canvas, 14
+    kpis = sports_kpis(city)
+    rows = (len(kpis) + 1) // 2
+    header_h, row_h = 52, 24
+    height = header_h + pad + 28 + rows * row_h + pad
+    layout.ensure_space(height)
+    x, y, w = layout.margin, layout.y, layout.width
+
+    c.rect(x, y, w, height, fill=_SPORTS["card"], stroke=_SPORTS["border"])
+    name = clean_text(city.get("name", "N/A"))
+    c.text(x + pad, y + 24, name, "bold", 15, _SPORTS["white"])
+    if is_recommended:
+        badge_x = x + pad + text_width(name, "bold", 15) + 10
+        badge_w = text_width("RECOMENDADO", "bold", 8) + 16
+        c.rect(badge_x, y + 12, badge_w, 15, fill=_SPORTS["green"])
+        c.text(badge_x + 8, y + 22.5, "RECOMENDADO", "bold", 8, _SPORTS["white"])
+    c.text(x + pad, y + 41, clean_text(city.get("main_venue", "N/A")), "regular", 9.5, _SPORTS["blue"])
+    c.line(x, y + header_h, x + w, y + header_h, _SPORTS["border"])
+
+    top = y + header_h + pad
+    c.text(x + pad, top + 11, "Indicadores Clave de Rendimiento (KPIs)", "bold", 11, _SPORTS["white"])
+    c.line(x + pad, top + 20, x + w - pad, top + 20, _SPORTS["border"])
+    col_w = (w - 2 * pad) / 4
+    for i, (label, value) in enumerate(kpis):
+        row, col = divmod(i, 2)
+        base = top + 28 + row * row_h
+        c.text(x + pad + col * 2 * col_w + 4, base + 15, clean_text(label), "regular", 9.5, _SPORTS["secondary"])
+        c.text(x + pad + (col * 2 + 1) * col_w + 4, base + 15, clean_text(value), "bold", 9.5, _SPORTS["white"])
+        if col == 1 or i == len(kpis) - 1:
+            c.line(x + pad, base + row_h, x + w - pad, base + row_h, _SPORTS["border"])
+    layout.y += height + 15
+
+
+def _render_sports(data: dict) -> bytes:
+    canvas = PdfCanvas(background=_SPORTS["bg"])
+    layout = _ReportLayout(canvas, margin=20)
+    layout.ensure_space(50)
+    canvas.rect(layout.margin, layout.y, layout.width, 50, fill=_SPORTS["card"], stroke=_SPORTS["border"])
+    title = "Informe de Potencial para Eventos Deportivos"
+    canvas.text((PAGE_WIDTH - text_width(title, "bold", 18)) / 2, layout.y + 31, title, "bold", 18, _SPORTS["white"])
+    layout.y += 62
+
+    recommendations = data.get("recommendations", {})
+    _summary_cards(layout, data.get("summary", "No disponible."), _SPORTS, title_size=15, header_h=34, gap=15)
+    if recommendations.get("recommended"):
+        _sports_city(layout, recommendations["recommended"], is_recommended=True)
+    for city in recommendations.get("alternatives", []):
+        _sports_city(layout, city, is_recommended=False)
+    return canvas.to_bytes()
+
+
+# --- Informe IA MICE (tema claro, como report_mice.css) ---
+
+_MICE = {"bg": "#f0f2f5", "card": "#ffffff", "border": "#e2e8f0", "title": "#667eea", "heading": "#2d3748",
+         "text": "#2d3748", "summary": "#4a5568", "label": "#718096", "row": "#edf2f7"}
+
+
+def _mice_city(layout: _ReportLayout, city: dict, is_recommended: bool):
+    c, pad = layout.canvas, 15
+    title, color = MICE_RECOMMENDED_STYLE if is_recommended else MICE_ALTERNATIVE_STYLE
+    kpis = mice_kpis(city.get("kpi", {}))
+    header_h, row_h = 36, 22
+    height = header_h + pad + 24 + len(kpis) * row_h + pad
+    layout.ensure_space(height)
+    x, y, w = layout.margin, layout.y, layout.width
+
+    c.rect(x, y, w, height, fill=_MICE["card"], stroke=_MICE["border"])
+    c.rect(x, y, w, header_h, fill=color)
+    c.text(x + pad, y + 23, f"{clean_text(title)}: {clean_text(city.get('name', 'N/A'))}", "bold", 13, "#ffffff")
+    top = y + header_h + pad
+    c.text(x + pad, top + 12, clean_text(city.get("logistics", {}).get("main_venue", "N/A")), "bold", 10.5, _MICE["title"])
+    for i, (label, value) in enumerate(kpis):
+        base = top + 24 + i * row_h
+        label, value = clean_text(f"{label}:"), clean_text(value)
+        c.text(x + pad, base + 15, label, "regular", 10.5, _MICE["label"])
+        c.text(x + w - pad - text_width(value, "bold", 10.5), base + 15, value, "bold", 10.5, _MICE["text"])
+        if i < len(kpis) - 1:
+            c.line(x + pad, base + row_h, x + w - pad, base + row_h, _MICE["row"])
+    layout.y += height + 18
+
+
+def _render_mice(data: dict) -> bytes:
+    canvas = PdfCanvas(background=_MICE["bg"])
+    layout = _ReportLayout(canvas, margin=36)
+    title = "Informe de Recomendaciones IA MICE"
+    canvas.text((PAGE_WIDTH - text_width(title, "bold", 20)) / 2, layout.y + 22, title, "bold", 20, _MICE["title"])
+    canvas.line(layout.margin, layout.y + 38, layout.margin + layout.width, layout.y + 38, _MICE["title"], width=2.25)
+    layout.y += 58
+
+    recommendations = data.get("recommendations", {})
+    _summary_cards(layout, data.get("summary", "No disponible."), _MICE, title_size=14, header_h=38, gap=18)
+    if recommendations.get("recommended"):
+        _mice_city(layout, recommendations["recommended"], is_recommended=True)
+    for city in recommendations.get("alternatives", []):
+        _mice_city(layout, city, is_recommended=False)
+    return canvas.to_bytes()
+
+
+_RENDERERS = {"sports": _render_sports, "mice": _render_mice}
+
+
+def render_fast_pdf(data: dict, variant: str) -> bytes:
+    """Genera el PDF de la variante (`sports` o `mice`) sin navegador. Es síncrono y solo usa CPU."""
+    return _RENDERERS[variant](data)
@@ -0,0 +1,53 @@
+# hedging.py
+
+import asyncio
+import math
+from collections import deque
+
+# Peticiones "hedged": si la primera tarda más de lo normal (un percentil de las latencias
+# recientes), se lanza una segunda idéntica y se usa la que termine antes. Así una búsqueda
+# atascada no marca la latencia de todo el tema.
+
+
+class LatencyTracker:
+    """Ventana deslizante de latencias observadas, para calcular percentiles baratos."""
+
+    def __init__(self, window: int = 200):
+        self._samples: deque[float] = deque(maxlen=window)
+
+    def observe(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, p: float, min_samples: int = 1) -> float | None:
+        if len(self._samples) < max(1, min_samples):
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, math.ceil(len(ordered) * p / 100) - 1)]
+
+
+async def hedged_call(factory, hedge_after: float | None, hedge_factory=None):
+    """
+    Ejecuta `factory()` (una corrutina) y, si no ha terminado tras `hedge_after` segundos, lanza una
+    segunda copia con `hedge_factory()` (por defecto, la misma `factory`). Devuelve `(resultado,
+    hedge_ganó)` de la primera que termine bien; si todas fallan, propaga el último error. Las copias
+    sobrantes se cancelan.
+    """
+    hedge_factory = hedge_factory or factory
+    first = asyncio.ensure_future(factory())
+    tasks = [first]
+    try:
+        if hedge_after is not None:
+            done, _ = await asyncio.wait({first}, timeout=hedge_after)
+            if not done:
+                tasks.append(asyncio.ensure_future(hedge_factory()))
+        pending, error = set(tasks), None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result(), task is not first
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,129 @@
+# incremental_json.py
+
+import json
+
+# Parser de JSON en streaming: recibe el texto por trozos (los deltas del Director) y devuelve
+# cada valor en cuanto se cierra, si su ruta está entre las vigiladas. No construye el documento
+# entero: solo sigue la estructura (objetos, arrays, strings) y, al cerrarse un valor vigilado,
+# lo decodifica con `json.loads` a partir del texto acumulado.
+#
+# Las rutas son tuplas de claves e índices, p. ej. ("recommendations", "alternatives", 0).
+# En los patrones vigilados, "*" encaja con cualquier índice o clave.
+# Todo lo anterior al primer `{` o `[` (p. ej. un bloque ```json) y lo posterior al cierre
+# del documento se ignora.
+
+_WHITESPACE = " \t\r\n"
+
+
+class IncrementalJsonParser:
+    def __init__(self, watch: list[tuple]):
+        self.watch = [tuple(pattern) for pattern in watch]
+        self._buffer = ""
+        self._pos = 0
+        self._frames: list[dict] = []
+        self._done = False
+        self._in_string = False
+        self._escape = False
+        self._string = None    # (ruta o None si es una clave, inicio)
+        self._scalar = None    # (ruta, inicio) de un número / true / false / null en curso
+
+    def _watched(self, path: tuple) -> bool:
+        return any(
+            len(pattern) == len(path) and all(p == "*" or p == k for p, k in zip(pattern, path))
+            for pattern in self.watch
+        )
+
+    def feed(self, chunk: str) -> list[tuple[tuple, object]]:
+        """Añade texto y devuelve los valores vigilados completados por él, como `(ruta, valor)`."""
+        self._buffer += chunk
+        completed = []
+        buffer = self._buffer
+        for i in range(self._pos, len(buffer)):
+            if self._done:
+                break
+            self._step(buffer[i], i, completed)
+        self._pos = len(buffer)
+        return completed
+
+    def _complete(self, path: tuple, start: int, end: int, completed: list):
+        if self._watched(path):
+            try:
+                completed.append((path, json.loads(self._buffer[start:end])))
+            except json.JSONDecodeError:
+                pass  # El texto no era JSON válido; el parseo final lo reportará.
+
+    def _start_value(self, path: tuple, c: str, i: int):
+        if c in "{[":
+            self._frames.append({"kind": "obj" if c == "{" else "arr", "path": path, "start": i,
+                                 "expect": "key" if c == "{" else "value", "key": None, "index": 0})
+        elif c == '"':
+            self._in_string, self._string = True, (path, i)
+        else:
+            self._scalar = (path, i)
+
+    def _close(self, i: int, completed: list):
+        frame = self._frames.pop()
+        self._complete(frame["path"], frame["start"], i + 1, completed)
+        if not self._frames:
+            self._done = True
+
+    def _step(self, c: str, i: int, completed: list):
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif c == "\\":
+                self._escape = True
+            elif c == '"':
+                self._in_string = False
+                path, start = self._string
+                if path is None:
+                    frame = self._frames[-1]
+                    frame["key"], frame["expect"] = json.loads(self._buffer[start:i + 1]), "colon"
+                else:
+                    self._complete(path, start, i + 1, completed)
+            return
+
+        if self._scalar is not None:
+            if c not in _WHITESPACE and c not in ",}]":
+                return
+            path, start = self._scalar
+            self._scalar = None
+            self._complete(path, start, i, completed)
+
+        if not self._frames:
+            if c in "{[":
+                self._start_value((), c, i)
+            return
+
+        frame = self._frames[-1]
+        if c in _WHITESPACE:
+            return
+        expect = frame["expect"]
+        if frame["kind"] == "obj":
+            if expect == "key":
+                if c == '"':
+                    self._in_string, self._string = True, (None, i)
+                elif c == "}":
+                    self._close(i, completed)
+            elif expect == "colon":
+                if c == ":":
+                    frame["expect"] = "value"
+            elif expect == "value":
+                frame["expect"] = "comma"
+                self._start_value(frame["path"] + (frame["key"],), c, i)
+            elif c == ",":
+                frame["expect"] = "key"
+            elif c == "}":
+                self._close(i, completed)
+        else:
+            if expect == "value":
+                if c == "]":
+                    self._close(i, completed)
+                else:
+                    frame["expect"] = "comma"
+                    self._start_value(frame["path"] + (frame["index"],), c, i)
+            elif c == ",":
+                frame["index"] += 1
+                frame["expect"] = "value"
+            elif c == "]":
+                self._close(i, completed)
@@ -1,14 +1,109 @@
 # logging_config.py
 
+import atexit
+import json
 import logging
-from logtail import LogtailHandler
+import logging.handlers
 import os
+import queue
+import random
+import sys
+import threading
 from dotenv import load_dotenv
 
 load_dotenv()
 
-# Obtenemos el token desde las variables de entorno
-handler = LogtailHandler(source_token=os.getenv("LOGTAIL_SOURCE_TOKEN"))
+# --- Configuración (variables de entorno) ---
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_BATCH_SIZE = int(os.getenv("LOG_BATCH_SIZE", "500"))
+LOG_FLUSH_INTERVAL = float(os.getenv("LOG_FLUSH_INTERVAL", "2"))
+# Tamaño máximo (caracteres) de cada campo de `extra` y del total de `extra` de un registro.
+LOG_MAX_FIELD_CHARS = int(os.getenv("LOG_MAX_FIELD_CHARS", "2000"))
+LOG_MAX_EXTRA_CHARS = int(os.getenv("LOG_MAX_EXTRA_CHARS", "8000"))
+# Fracción de búsquedas individuales que se registran (1 = todas).
+LOG_SEARCH_SAMPLE_RATE = float(os.getenv("LOG_SEARCH_SAMPLE_RATE", "0.1"))
+# Volcados completos de prompts e informes en consola, solo para depurar.
+DEBUG_DUMPS = os.getenv("DEBUG_DUMPS", "false").lower() in ("1", "true", "yes")
+
+# Atributos que trae cualquier LogRecord; el resto son los `extra` del registro.
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "taskName"}
+
+
+def _truncate(value, limit: int):
+    if isinstance(value, (str, bytes)):
+        text = value if isinstance(value, str) else value.decode("utf-8", "replace")
+    elif isinstance(value, (int, float, bool)) or value is None:
+        return value
+    else:
+        text = json.dumps(value, ensure_ascii=False, default=str)
+        if len(text) <= limit:
+            return value
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}… [truncado, {len(text)} caracteres]"
+
+
+class _TruncateExtras(logging.Filter):
+    """Recorta los `extra` grandes (informes, resúmenes, JSON completos) antes de enviarlos."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        budget = LOG_MAX_EXTRA_CHARS
+        for name in [key for key in vars(record) if key not in _RECORD_ATTRS]:
+            value = _truncate(getattr(record, name), max(0, min(LOG_MAX_FIELD_CHARS, budget)))
+            setattr(record, name, value)
+            budget -= len(value) if isinstance(value, str) else len(json.dumps(value, default=str))
+        return True
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Encola sin bloquear nunca el event loop: si la cola está llena, el registro se descarta."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        if listener is None:
+            start_logging()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+# El envío real (formateo, serialización y subida por lotes a Better Stack) lo hace un hilo
+# aparte; el event loop solo mete el registro en una cola. Sin token, los logs van a la consola.
+def _build_ship_handler() -> logging.Handler:
+    source_token = os.getenv("LOGTAIL_SOURCE_TOKEN")
+    if source_token:
+        from logtail import LogtailHandler
+        ship_handler = LogtailHandler(source_token=source_token, buffer_capacity=LOG_BATCH_SIZE, flush_interval=LOG_FLUSH_INTERVAL)
+    else:
+        ship_handler = logging.StreamHandler(sys.stderr)
+        ship_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    ship_handler.addFilter(_TruncateExtras())
+    return ship_handler
+
+
+handler = _DroppingQueueHandler(queue.Queue(maxsize=LOG_QUEUE_SIZE))
+listener: logging.handlers.QueueListener | None = None
+_listener_lock = threading.Lock()
+
+
+def start_logging():
+    """
+    Crea el handler de envío y arranca su hilo. La API lo llama al arrancar; si no, se arranca
+    con el primer registro. Así importar el módulo no carga Logtail ni lanza hilos.
+    """
+    global listener
+    with _listener_lock:
+        if listener is not None:
+            return
+        listener = logging.handlers.QueueListener(handler.queue, _build_ship_handler(), respect_handler_level=True)
+        listener.start()
+        # Al salir se vacía la cola; `logging.shutdown` (que corre después) sube lo que quede en el buffer.
+        atexit.register(listener.stop)
+
 
 # Creamos un logger llamado 'mice_logger'
 logger = logging.getLogger('mice_logger')
@@ -16,4 +111,19 @@ logger.setLevel(logging.INFO)
 
 # Si no tiene ya un handler (para evitar duplicados), se lo añadimos
 if not logger.handlers:
-    logger.addHandler(handler)
\ No newline at end of file
+    logger.addHandler(handler)
+
+
+def sampled(rate: float) -> bool:
+    """Decide si se registra un evento muestreado con probabilidad `rate`."""
+    return rate >= 1 or random.random() < rate
+
+
+def debug_dump(title: str, content):
+    """Vuelca `content` (texto u objeto JSON) en consola si DEBUG_DUMPS está activo; si no, no cuesta nada."""
+    if not DEBUG_DUMPS:
+        return
+    if not isinstance(content, str):
+        content = json.dumps(content, indent=2, ensure_ascii=False, default=str)
+    separator = "=" * 60
+    print(f"\n{separator}\n{title}\n{content}\n{separator}\n", file=sys.stderr, flush=True)
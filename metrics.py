@@ -0,0 +1,169 @@
+# metrics.py
+
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# Métricas del proceso en formato de exposición de Prometheus (texto), sin dependencias externas.
+# Se exponen en `/metrics`; cada módulo importa las métricas que necesita desde aquí.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames: tuple, values: tuple, extra: dict | None = None) -> str:
+    pairs = list(zip(labelnames, values)) + list((extra or {}).items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.type_name}", *self._samples()]
+
+    def _samples(self) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Gauge(_Metric):
+    """Gauge cuyo valor se lee en cada scrape a través de una función."""
+    type_name = "gauge"
+
+    def __init__(self, name: str, help_text: str):
+        super().__init__(name, help_text)
+        self._function = lambda: 0
+
+    def set_function(self, function):
+        self._function = function
+
+    def _samples(self) -> list[str]:
+        return [f"{self.name} {_format_value(self._function())}"]
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._series: dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._series.get(key, ([0] * len(self.buckets), 0.0))
+            for i, upper in enumerate(self.buckets):
+                if value <= upper:
+                    counts[i] += 1
+            self._series[key] = (counts, total + value)
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self._series.items())
+        lines = []
+        for key, (counts, total) in items:
+            for upper, count in zip(self.buckets, counts):
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, {'le': _format_value(upper)})} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {counts[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: list[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+PHASE_SECONDS = registry.register(Histogram(
+    "mice_phase_duration_seconds", "Duración de cada fase del análisis y del render de PDF.", ("phase",)))
+PHASE_ERRORS = registry.register(Counter(
+    "mice_phase_errors_total", "Errores por fase del análisis y del render de PDF.", ("phase",)))
+CACHE_REQUESTS = registry.register(Counter(
+    "mice_cache_requests_total", "Consultas a las cachés por resultado (hit, miss, shared).", ("cache", "result")))
+RESEARCH_TOKENS = registry.register(Counter(
+    "mice_research_report_tokens_total", "Tokens estimados del informe de investigación antes y después de compactarlo.", ("stage",)))
+RESEARCH_SEARCHES = registry.register(Counter(
+    "mice_research_searches_total", "Búsquedas web por resultado (primary, hedge, deadline, quorum_dropped).", ("outcome",)))
+DIRECTOR_TOKENS = registry.register(Counter(
+    "mice_director_tokens_total", "Tokens del Director con el motor chat (prompt, cached, completion).", ("kind",)))
+STARTUP_READY_SECONDS = registry.register(Gauge(
+    "mice_startup_ready_seconds", "Segundos desde el primer import de la API hasta terminar el calentamiento."))
+ANALYSES_IN_FLIGHT = registry.register(Gauge(
+    "mice_analyses_in_flight", "Análisis ejecutándose ahora mismo."))
+ANALYSES_QUEUED = registry.register(Gauge(
+    "mice_analyses_queued", "Análisis admitidos esperando turno."))
+
+
+@contextmanager
+def track_phase(phase: str, timings: dict | None = None):
+    """Mide el bloque en el histograma de fases; cuenta los errores y, si se pasa `timings`, acumula ahí los segundos."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        PHASE_ERRORS.inc(phase=phase)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        PHASE_SECONDS.observe(elapsed, phase=phase)
+        if timings is not None:
+            timings[phase] = timings.get(phase, 0.0) + elapsed
+
+
+def server_timing_header(timings: dict, descriptions: dict | None = None) -> str:
+    """Formatea `timings` (segundos) como cabecera `Server-Timing` (milisegundos)."""
+    parts = [f'{name};desc="{desc}"' for name, desc in (descriptions or {}).items()]
+    parts += [f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items()]
+    return ", ".join(parts)
@@ -0,0 +1,148 @@
+# pdf_cache.py
+
+import asyncio
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from logging_config import logger
+from metrics import CACHE_REQUESTS
+
+
+class PdfCache:
+    """
+    Caché de PDFs direccionada por contenido.
+
+    La clave es un hash del diccionario de entrada canonicalizado más la variante de plantilla,
+    así que el mismo informe siempre produce la misma clave (y el mismo ETag).
+    Tiene un nivel en memoria (LRU acotado por bytes) y un nivel opcional en disco con
+    expulsión por tamaño. Las peticiones concurrentes para la misma clave comparten un único render.
+    """
+
+    def __init__(self, max_memory_bytes: int, disk_dir: str | None = None, max_disk_bytes: int = 0):
+        self.max_memory_bytes = max_memory_bytes
+        self.disk_dir = disk_dir or None
+        self.max_disk_bytes = max_disk_bytes
+        self._memory: OrderedDict[str, bytes] = OrderedDict()
+        self._memory_bytes = 0
+        self._in_flight: dict[str, asyncio.Future] = {}
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(data: dict, variant: str) -> str:
+        canonical = json.dumps(data, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+        return hashlib.sha256(f"{variant}\n{canonical}".encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> bytes | None:
+        pdf_bytes = self._memory.get(key)
+        if pdf_bytes is not None:
+            self._memory.move_to_end(key)
+            return pdf_bytes
+        if self.disk_dir:
+            pdf_bytes = await asyncio.to_thread(self._read_disk, key)
+            if pdf_bytes is not None:
+                self._put_memory(key, pdf_bytes)
+                return pdf_bytes
+        return None
+
+    async def put(self, key: str, pdf_bytes: bytes):
+        self._put_memory(key, pdf_bytes)
+        if self.disk_dir:
+            try:
+                await asyncio.to_thread(self._write_disk, key, pdf_bytes)
+            except OSError as e:
+                logger.warning("No se pudo guardar el PDF en la caché de disco", extra={"error": str(e)})
+
+    async def get_or_create(self, key: str, factory) -> bytes:
+        """Devuelve el PDF cacheado o lo genera con `factory()` (una corrutina) una única vez por clave."""
+        pdf_bytes = await self.get(key)
+        if pdf_bytes is not None:
+            CACHE_REQUESTS.inc(cache="pdf", result="hit")
+            return pdf_bytes
+        while key in self._in_flight:
+            future = self._in_flight[key]
+            try:
+                pdf_bytes = await asyncio.shield(future)
+                CACHE_REQUESTS.inc(cache="pdf", result="shared")
+                return pdf_bytes
+            except asyncio.CancelledError:
+                # Si se canceló el render ajeno (y no esta petición), lo intentamos nosotros.
+                if not future.cancelled() or asyncio.current_task().cancelling():
+                    raise
+
+        CACHE_REQUESTS.inc(cache="pdf", result="miss")
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            pdf_bytes = await factory()
+            await self.put(key, pdf_bytes)
+            future.set_result(pdf_bytes)
+            return pdf_bytes
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Evita el aviso de "exception was never retrieved" si nadie más esperaba este render.
+            future.exception()
+            raise
+        finally:
+            del self._in_flight[key]
+
+    # --- Nivel en memoria ---
+
+    def _put_memory(self, key: str, pdf_bytes: bytes):
+        if len(pdf_bytes) > self.max_memory_bytes:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= len(previous)
+        self._memory[key] = pdf_bytes
+        self._memory_bytes += len(pdf_bytes)
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    # --- Nivel en disco (se ejecuta en un hilo para no bloquear el event loop) ---
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.pdf")
+
+    def _read_disk(self, key: str) -> bytes | None:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                pdf_bytes = f.read()
+            os.utime(path)  # Marca el acceso para que la expulsión sea LRU.
+            return pdf_bytes
+        except FileNotFoundError:
+            return None
+
+    def _write_disk(self, key: str, pdf_bytes: bytes):
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(pdf_bytes)
+        os.replace(tmp_path, path)
+        self._evict_disk()
+
+    def _evict_disk(self):
+        entries = []
+        total = 0
+        with os.scandir(self.disk_dir) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.endswith(".pdf"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+        if total <= self.max_disk_bytes:
+            return
+        for _, size, path in sorted(entries):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            if total <= self.max_disk_bytes:
+                break
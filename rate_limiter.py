@@ -0,0 +1,205 @@
+# rate_limiter.py
+
+import asyncio
+import random
+import re
+import time
+from collections import OrderedDict, deque
+from logging_config import logger
+from metrics import track_phase
+
+_DURATION_PART_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def parse_duration(value: str | None) -> float | None:
+    """Convierte duraciones de cabeceras de OpenAI ('20ms', '1.5s', '6m0s', '12') a segundos."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PART_RE.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def retry_after_from_error(error: Exception) -> float | None:
+    """Si `error` es un 429, devuelve cuánto esperar según sus cabeceras (0 si no lo indican)."""
+    if getattr(error, "status_code", None) != 429:
+        return None
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    retry_after_ms = parse_duration(headers.get("retry-after-ms"))
+    if retry_after_ms is not None:
+        return retry_after_ms / 1000
+    for header in ("retry-after", "x-ratelimit-reset-requests", "x-ratelimit-reset-tokens"):
+        seconds = parse_duration(headers.get(header))
+        if seconds is not None:
+            return seconds
+    return 0.0
+
+
+class TokenBucket:
+    """Cubo de tokens que se rellena de forma continua hasta `per_minute` unidades por minuto."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.available = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        self._refill()
+        amount = min(amount, self.capacity)
+        return 0.0 if self.available >= amount else (amount - self.available) / self.rate
+
+    def consume(self, amount: float):
+        self._refill()
+        self.available -= min(amount, self.capacity)
+
+    def adjust(self, amount: float):
+        """Devuelve (o cobra, si es negativo) unidades ya consumidas; el saldo puede quedar en deuda."""
+        self._refill()
+        self.available = min(self.capacity, self.available + amount)
+
+    def limit_to(self, remaining: float):
+        """Nunca creer que queda más cupo del que dice el servidor."""
+        self._refill()
+        self.available = min(self.available, remaining)
+
+    def drain(self):
+        self.limit_to(0.0)
+
+
+class RateLimitScheduler:
+    """
+    Planificador de llamadas a OpenAI compartido por todo el proceso.
+
+    - Dos cubos de tokens: peticiones por minuto y tokens por minuto. Los tokens se cobran al admitir
+      la llamada con una estimación y se corrigen con el consumo real al terminar (`settle`).
+    - Reparto justo: cada análisis (`owner`) tiene su cola y se atienden por turnos (round-robin),
+      así un análisis con muchas búsquedas no deja sin servicio a los demás.
+    - Un 429 o unas cabeceras `x-ratelimit-remaining-* = 0` pausan a todos hasta el reset indicado,
+      y la llamada fallida se reintenta con backoff exponencial.
+    """
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int, max_retries: int = 5, base_backoff: float = 1.0):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self._queues: OrderedDict[str, deque] = OrderedDict()
+        self._paused_until = 0.0
+        self._wakeup: asyncio.Event | None = None
+        self._dispatcher: asyncio.Task | None = None
+
+    async def call(self, owner: str, estimated_tokens: int, factory):
+        """Ejecuta `factory()` (una corrutina) cuando haya cupo, reintentando si OpenAI devuelve 429."""
+        for attempt in range(self.max_retries + 1):
+            with track_phase("rate_limit_wait"):
+                await self.acquire(owner, estimated_tokens)
+            try:
+                return await factory()
+            except Exception as e:
+                retry_after = retry_after_from_error(e)
+                if retry_after is None or attempt == self.max_retries:
+                    raise
+                backoff = max(retry_after, self.base_backoff * 2 ** attempt) * (1 + random.random() * 0.25)
+                logger.warning("OpenAI devolvió 429, pausando llamadas", extra={"owner": owner, "wait_seconds": round(backoff, 2), "attempt": attempt + 1})
+                self.pause(backoff)
+
+    async def acquire(self, owner: str, estimated_tokens: int):
+        self._ensure_dispatcher()
+        future = asyncio.get_running_loop().create_future()
+        waiter = (future, estimated_tokens)
+        self._queues.setdefault(owner, deque()).append(waiter)
+        self._wakeup.set()
+        try:
+            await future
+        except asyncio.CancelledError:
+            queue = self._queues.get(owner)
+            if queue is not None and waiter in queue:
+                queue.remove(waiter)
+                if not queue:
+                    del self._queues[owner]
+            raise
+
+    def pause(self, seconds: float):
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def settle(self, estimated_tokens: int, actual_tokens: int | None):
+        """Corrige el cubo de tokens con el `usage` real de una llamada a la que se cobró `estimated_tokens`."""
+        if actual_tokens is None:
+            return
+        self.tokens.adjust(estimated_tokens - actual_tokens)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def observe_headers(self, headers):
+        """Ajusta los cubos con las cabeceras `x-ratelimit-*` de una respuesta correcta."""
+        for kind, bucket in (("requests", self.requests), ("tokens", self.tokens)):
+            remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+            if remaining is None:
+                continue
+            try:
+                remaining = float(remaining)
+            except ValueError:
+                continue
+            if remaining <= 0:
+                bucket.drain()
+                reset = parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+                if reset:
+                    self.pause(reset)
+            else:
+                bucket.limit_to(remaining)
+
+    # --- Despachador ---
+
+    def _ensure_dispatcher(self):
+        loop = asyncio.get_running_loop()
+        if self._dispatcher is None or self._dispatcher.done() or self._dispatcher.get_loop() is not loop:
+            self._wakeup = asyncio.Event()
+            self._dispatcher = loop.create_task(self._dispatch())
+
+    async def _dispatch(self):
+        while True:
+            if not self._queues:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            owner, queue = next(iter(self._queues.items()))
+            future, estimated_tokens = queue[0]
+            delay = max(
+                self._paused_until - time.monotonic(),
+                self.requests.wait_time(1),
+                self.tokens.wait_time(estimated_tokens),
+            )
+            if delay > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            queue.popleft()
+            # Turno rotatorio: el análisis atendido pasa al final de la fila.
+            del self._queues[owner]
+            if queue:
+                self._queues[owner] = queue
+            if not future.done():
+                self.requests.consume(1)
+                self.tokens.consume(estimated_tokens)
+                future.set_result(None)
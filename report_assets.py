@@ -0,0 +1,45 @@
+# report_assets.py
+
+import base64
+import os
+import re
+
+# Las plantillas de PDF no cargan nada de la red: el CSS y las fuentes viven en `assets/`
+# y se incrustan en el HTML. Las fuentes se buscan como `assets/fonts/<Familia>-<peso>.<ext>`
+# (p. ej. `Montserrat-600.woff2`); si no hay fichero, Chromium usa la fuente instalada en el
+# sistema con ese nombre (la imagen Docker instala `fonts-montserrat`).
+
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets")
+
+_FONT_FORMATS = {".woff2": "woff2", ".woff": "woff", ".ttf": "truetype", ".otf": "opentype"}
+_FONT_FILE_RE = re.compile(r"^(?P<family>[A-Za-z0-9 ]+)-(?P<weight>\d{3})$")
+
+
+def load_css(name: str) -> str:
+    with open(os.path.join(ASSETS_DIR, "css", name), encoding="utf-8") as f:
+        return f.read()
+
+
+def font_face_css(families: set[str]) -> str:
+    """Genera reglas @font-face con las fuentes empaquetadas de `families`, incrustadas como data URI."""
+    fonts_dir = os.path.join(ASSETS_DIR, "fonts")
+    if not os.path.isdir(fonts_dir):
+        return ""
+    rules = []
+    for filename in sorted(os.listdir(fonts_dir)):
+        stem, ext = os.path.splitext(filename)
+        match = _FONT_FILE_RE.match(stem)
+        if ext not in _FONT_FORMATS or not match or match["family"] not in families:
+            continue
+        with open(os.path.join(fonts_dir, filename), "rb") as f:
+            encoded = base64.b64encode(f.read()).decode("ascii")
+        rules.append(
+            f"@font-face {{ font-family: '{match['family']}'; font-weight: {match['weight']}; font-style: normal; "
+            f"src: url(data:font/{_FONT_FORMATS[ext]};base64,{encoded}) format('{_FONT_FORMATS[ext]}'); }}"
+        )
+    return "\n".join(rules)
+
+
+def report_css(name: str, font_families: set[str]) -> str:
+    """CSS completo de una plantilla de informe: fuentes empaquetadas + hoja de estilos."""
+    return f"{font_face_css(font_families)}\n{load_css(name)}"
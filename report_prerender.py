@@ -0,0 +1,78 @@
+# report_prerender.py
+
+import asyncio
+import time
+from collections import OrderedDict
+from logging_config import logger
+from pdf_cache import PdfCache
+
+
+class ReportPrerenderer:
+    """
+    Informes finales recientes, por id, con sus PDFs renderizados de forma especulativa.
+
+    Casi todos los análisis terminan exportándose a PDF: en cuanto hay `final_result` se guarda el
+    informe con un id derivado de su contenido y se lanzan en segundo plano los renders de las
+    variantes configuradas. Van a través de la caché de PDFs, así que una petición que llegue a mitad
+    se une al render en curso en vez de repetirlo. Los renders especulativos tienen su propio límite
+    de concurrencia para no quitar sitio en el pool de Chromium a las peticiones de los usuarios.
+    """
+
+    def __init__(self, render, variants: list[str], renderer: str, max_reports: int, retention: float, max_concurrency: int):
+        self.render = render  # corrutina `render(data, variant, timings=None, renderer=...)`
+        self.variants = variants
+        self.renderer = renderer
+        self.max_reports = max_reports
+        self.retention = retention
+        self._slots = asyncio.Semaphore(max(1, max_concurrency))
+        self._reports: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._tasks: set[asyncio.Task] = set()
+        self._rendered = 0
+        self._failed = 0
+
+    @staticmethod
+    def report_id(data: dict) -> str:
+        return PdfCache.make_key(data, "report")[:32]
+
+    def submit(self, data: dict) -> str:
+        """Guarda el informe, lanza sus renders en segundo plano y devuelve su id."""
+        report_id = self.report_id(data)
+        known = report_id in self._reports
+        self._reports[report_id] = (time.monotonic() + self.retention, data)
+        self._reports.move_to_end(report_id)
+        while len(self._reports) > self.max_reports:
+            self._reports.popitem(last=False)
+        if not known:
+            for variant in self.variants:
+                task = asyncio.create_task(self._prerender(report_id, data, variant))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+        return report_id
+
+    def get(self, report_id: str) -> dict | None:
+        entry = self._reports.get(report_id)
+        if entry is None:
+            return None
+        expires_at, data = entry
+        if expires_at < time.monotonic():
+            del self._reports[report_id]
+            return None
+        return data
+
+    async def _prerender(self, report_id: str, data: dict, variant: str):
+        async with self._slots:
+            try:
+                await self.render(data, variant, renderer=self.renderer)
+                self._rendered += 1
+            except Exception as e:
+                # No es grave: si alguien pide el PDF, se renderiza en ese momento.
+                self._failed += 1
+                logger.warning("Falló el render especulativo de un PDF", extra={"report_id": report_id, "variant": variant, "error": str(e)})
+
+    async def stop(self):
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {"reports": len(self._reports), "prerendering": len(self._tasks), "rendered": self._rendered, "failed": self._failed}
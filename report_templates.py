@@ -0,0 +1,171 @@
+# report_templates.py
+
+from string import Template
+from report_assets import report_css
+
+# Plantillas HTML de los informes PDF. Todo lo estático (CSS con las fuentes incrustadas,
+# estructura de la página y de las tarjetas) se compila una sola vez al importar el módulo;
+# por petición solo se sustituyen los datos del informe.
+#
+# Los bloques de datos (`sports_kpis`, `mice_kpis`) los comparten las plantillas HTML y el
+# renderizador sin navegador (`fast_pdf.py`), para que ambos muestren exactamente lo mismo.
+
+SPORTS_REPORT_CSS = report_css("report_sports.css", {"Montserrat"})
+MICE_REPORT_CSS = report_css("report_mice.css", {"Segoe UI"})
+
+
+def format_currency(value):
+    if not isinstance(value, (int, float)): return "N/A"
+    return f"{value:,.0f} €".replace(",", ".")
+
+
+# --- Datos de los bloques de KPIs ---
+
+def sports_kpis(city_data: dict) -> list[tuple[str, str]]:
+    kpi_main = city_data.get('kpi_main', {})
+    kpi_economic = city_data.get('kpi_economic', {})
+    return [
+        ("ROI Estimado", f"{kpi_main.get('roi_est', 'N/A')}x"),
+        ("Impacto Directo (€)", format_currency(kpi_economic.get('direct_impact_eur'))),
+        ("Puntuación Legado", f"{kpi_main.get('legacy_score', 'N/A')} / 10"),
+        ("Potencial Patrocinio", f"{kpi_main.get('sponsorship_potential', 'N/A')} / 10"),
+        ("ADR Hotel (€)", format_currency(kpi_economic.get('adr_eur'))),
+        ("Media Value (€)", format_currency(city_data.get('kpi_sponsorship', {}).get('media_value_eur'))),
+        ("Impacto SEA", f"{kpi_main.get('sea_impact_score', 'N/A')} / 100"),
+        ("Ajuste Presupuesto", f"{kpi_economic.get('budget_fit_percent', 'N/A')}%"),
+    ]
+
+
+def mice_kpis(kpi_data: dict) -> list[tuple[str, str]]:
+    return [
+        ("ROI Estimado", f"{kpi_data.get('roi_est', 'N/A')}x"),
+        ("ADR Hotel (€)", format_currency(kpi_data.get('adr_eur'))),
+        ("Capacidad Venue", f"{kpi_data.get('venue_capacity', 'N/A')}"),
+        ("Huella CO₂ (kg)", f"{kpi_data.get('co2_kg', 'N/A')}"),
+    ]
+
+
+# --- Informe de eventos deportivos ---
+
+_SPORTS_PAGE = Template(Template("""<!DOCTYPE html>
+<html lang="es">
+<head>
+    <meta charset="UTF-8">
+    <style>$css</style>
+</head>
+<body>
+    <div class="report-container">
+        <div class="header">
+            <h1>Informe de Potencial para Eventos Deportivos</h1>
+        </div>
+        <div class="card">
+            <div class="card-header"><h3>📝 Resumen Ejecutivo</h3></div>
+            <div class="card-body"><p class="summary-text">$$summary</p></div>
+        </div>
+        $$cities
+    </div>
+</body>
+</html>
+""").substitute(css=SPORTS_REPORT_CSS.replace("$", "$$")))
+
+_SPORTS_CITY = Template("""
+        <div class="card">
+            <div class="card-header">
+                <h3>$name $badge</h3>
+                <p class="venue">📍 $venue</p>
+            </div>
+            <div class="card-body">
+                <h4>Indicadores Clave de Rendimiento (KPIs)</h4>
+                <table class="kpi-table">$rows</table>
+            </div>
+        </div>""")
+
+_SPORTS_BADGE = '<span class="badge">⭐ RECOMENDADO</span>'
+_SPORTS_KPI_ROW = Template("<tr><th>$label1</th><td>$value1</td><th>$label2</th><td>$value2</td></tr>")
+
+
+def _sports_kpi_rows(city_data: dict) -> str:
+    kpis = sports_kpis(city_data)
+    if len(kpis) % 2:
+        kpis.append(("", ""))
+    return "".join(
+        _SPORTS_KPI_ROW.substitute(label1=label1, value1=value1, label2=label2, value2=value2)
+        for (label1, value1), (label2, value2) in zip(kpis[::2], kpis[1::2])
+    )
+
+
+def _sports_city_html(city_data: dict, is_recommended: bool = False) -> str:
+    return _SPORTS_CITY.substitute(
+        name=city_data.get('name', 'N/A'),
+        badge=_SPORTS_BADGE if is_recommended else '',
+        venue=city_data.get('main_venue', 'N/A'),
+        rows=_sports_kpi_rows(city_data),
+    )
+
+
+def generate_html_for_pdf(data: dict) -> str:
+    recommendations = data.get('recommendations', {})
+    recommended_city = recommendations.get('recommended')
+    cities = [_sports_city_html(recommended_city, is_recommended=True)] if recommended_city else []
+    cities += [_sports_city_html(city) for city in recommendations.get('alternatives', [])]
+    return _SPORTS_PAGE.substitute(summary=data.get('summary', 'No disponible.'), cities="".join(cities))
+
+
+# --- Informe IA MICE ---
+
+_MICE_PAGE = Template(Template("""<!DOCTYPE html>
+<html lang="es">
+<head>
+    <meta charset="UTF-8">
+    <style>$css</style>
+</head>
+<body>
+    <div class="report-container">
+        <div class="header"><h1>📊 Informe de Recomendaciones IA MICE</h1></div>
+        <div class="card">
+            <div class="card-header" style="background: #fff; color: #2d3748;"><h3>📝 Resumen Ejecutivo</h3></div>
+            <div class="card-body"><p class="summary-text">$$summary</p></div>
+        </div>
+        $$cities
+    </div>
+</body>
+</html>
+""").substitute(css=MICE_REPORT_CSS.replace("$", "$$")))
+
+_MICE_CITY = Template("""
+        <div class="card">
+            <div class="card-header" style="background-color: $color;">
+                $title: $name
+            </div>
+            <div class="card-body">
+                <p class="venue">📍 $venue</p>
+                <div class="kpi-block">$kpis</div>
+            </div>
+        </div>""")
+
+_MICE_KPI = Template('<div><span>$label:</span> <strong>$value</strong></div>')
+
+MICE_RECOMMENDED_STYLE = ("🏆 Sede Recomendada", "#48bb78")
+MICE_ALTERNATIVE_STYLE = ("🏙️ Sede Alternativa", "#ed8936")
+
+
+def _mice_city_html(city_data: dict, is_recommended: bool = False) -> str:
+    title, color = MICE_RECOMMENDED_STYLE if is_recommended else MICE_ALTERNATIVE_STYLE
+    return _MICE_CITY.substitute(
+        color=color,
+        title=title,
+        name=city_data.get('name', 'N/A'),
+        venue=city_data.get('logistics', {}).get('main_venue', 'N/A'),
+        kpis="".join(_MICE_KPI.substitute(label=label, value=value) for label, value in mice_kpis(city_data.get('kpi', {}))),
+    )
+
+
+def generate_html_for_mice_pdf(data: dict) -> str:
+    """
+    Genera un string HTML auto-contenido y estilizado para el informe de IA MICE.
+    """
+    recommendations = data.get('recommendations', {})
+    recommended_city = recommendations.get('recommended')
+    cities = [_mice_city_html(recommended_city, is_recommended=True)] if recommended_city else []
+    cities += [_mice_city_html(city) for city in recommendations.get('alternatives', [])]
+    return _MICE_PAGE.substitute(summary=data.get('summary', 'No disponible.'), cities="".join(cities))
@@ -0,0 +1,124 @@
+# research_cache.py
+
+import asyncio
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import Counter
+from logging_config import logger
+from metrics import CACHE_REQUESTS
+
+
+def normalize_text(text: str) -> str:
+    """Normaliza un tema o búsqueda para que variantes casi idénticas compartan entrada de caché."""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = re.sub(r"[^\w\s]", " ", text.lower())
+    return " ".join(text.split())
+
+
+class ResearchCache:
+    """
+    Caché persistente (SQLite) para planes del planificador y resúmenes de búsqueda.
+
+    Cada fase (`plan`, `search`) tiene su propio TTL. La clave combina fase, modelo y texto
+    normalizado. Cuando se supera `max_entries` se expulsan las entradas usadas hace más tiempo.
+    Las operaciones de SQLite se ejecutan en un hilo para no bloquear el event loop.
+    """
+
+    def __init__(self, path: str, ttls: dict[str, float], max_entries: int):
+        self.path = path
+        self.ttls = ttls
+        self.max_entries = max_entries
+        self.hits: Counter = Counter()
+        self.misses: Counter = Counter()
+        self._lock = threading.Lock()
+        self._conn = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    @staticmethod
+    def make_key(phase: str, text: str, model: str) -> str:
+        return hashlib.sha256(f"{phase}\n{model}\n{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    async def get(self, phase: str, text: str, model: str) -> str | None:
+        if not self.enabled:
+            return None
+        try:
+            value = await asyncio.to_thread(self._get, phase, self.make_key(phase, text, model))
+        except sqlite3.Error as e:
+            logger.warning("Error leyendo la caché de investigación", extra={"error": str(e)})
+            value = None
+        if value is None:
+            self.misses[phase] += 1
+        else:
+            self.hits[phase] += 1
+        CACHE_REQUESTS.inc(cache=f"research_{phase}", result="miss" if value is None else "hit")
+        return value
+
+    async def set(self, phase: str, text: str, model: str, value: str):
+        if not self.enabled:
+            return
+        try:
+            await asyncio.to_thread(self._set, phase, self.make_key(phase, text, model), value)
+        except sqlite3.Error as e:
+            logger.warning("Error escribiendo en la caché de investigación", extra={"error": str(e)})
+
+    def stats(self) -> dict:
+        return {
+            phase: {"hits": self.hits[phase], "misses": self.misses[phase], "ttl_seconds": ttl}
+            for phase, ttl in self.ttls.items()
+        }
+
+    # --- Acceso a SQLite (síncrono, siempre bajo `self._lock`) ---
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS research_cache ("
+                " key TEXT PRIMARY KEY, phase TEXT NOT NULL, value TEXT NOT NULL,"
+                " created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS research_cache_accessed ON research_cache (accessed_at)")
+            self._conn = conn
+        return self._conn
+
+    def _get(self, phase: str, key: str) -> str | None:
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT value, created_at FROM research_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, created_at = row
+            if now - created_at > self.ttls.get(phase, 0):
+                conn.execute("DELETE FROM research_cache WHERE key = ?", (key,))
+                conn.commit()
+                return None
+            conn.execute("UPDATE research_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            conn.commit()
+            return value
+
+    def _set(self, phase: str, key: str, value: str):
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO research_cache (key, phase, value, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, phase, value, now, now),
+            )
+            (count,) = conn.execute("SELECT COUNT(*) FROM research_cache").fetchone()
+            if count > self.max_entries:
+                conn.execute(
+                    "DELETE FROM research_cache WHERE key IN "
+                    "(SELECT key FROM research_cache ORDER BY accessed_at ASC LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+            conn.commit()
@@ -0,0 +1,197 @@
+# research_compaction.py
+
+import hashlib
+import random
+from collections import deque
+from dataclasses import dataclass, asdict
+from research_cache import normalize_text
+
+# Compactación del informe de investigación antes de devolverlo al Director:
+#
+# 1. Las búsquedas repetidas entre temas solo se ejecutan una vez (lo hace `ResearchTeamManager`
+#    con `query_key`) y su resumen aparece una sola vez en el informe, en el primer tema que la pidió.
+# 2. Los párrafos casi idénticos (MinHash sobre shingles de palabras, con LSH para no comparar todos
+#    contra todos) se descartan: se conserva la primera aparición.
+# 3. Con presupuesto de tokens, se reparten los párrafos por turnos entre temas (primero el primer
+#    párrafo de cada resumen de cada tema, etc.) hasta agotarlo, para que ningún tema se quede fuera.
+
+NUM_PERM = 64
+LSH_ROWS = 4  # 16 bandas de 4 filas: umbral efectivo en torno a 0.5 para ser candidato.
+SHINGLE_SIZE = 3
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(20240611)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+
+def query_key(query: str) -> str:
+    return normalize_text(query)
+
+
+def estimate_tokens(text: str) -> int:
+    """Aproximación barata (≈4 caracteres por token), suficiente para presupuestos e informes de ahorro."""
+    return (len(text) + 3) // 4
+
+
+def _shingles(text: str) -> set[str]:
+    words = normalize_text(text).split()
+    if len(words) <= SHINGLE_SIZE:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def minhash(text: str) -> tuple[int, ...] | None:
+    shingles = _shingles(text)
+    if not shingles:
+        return None
+    hashes = [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big") for s in shingles]
+    return tuple(min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS)
+
+
+def similarity(sig_a: tuple[int, ...], sig_b: tuple[int, ...]) -> float:
+    """Estimación de la similitud de Jaccard entre dos firmas MinHash."""
+    return sum(x == y for x, y in zip(sig_a, sig_b)) / NUM_PERM
+
+
+class NearDuplicateIndex:
+    """Índice LSH de firmas MinHash: dice si un texto es casi idéntico a alguno ya añadido."""
+
+    def __init__(self, threshold: float):
+        self.threshold = threshold
+        self._signatures: list[tuple[int, ...]] = []
+        self._buckets: dict[tuple, list[int]] = {}
+
+    def _bands(self, signature: tuple[int, ...]):
+        for band in range(0, NUM_PERM, LSH_ROWS):
+            yield (band, signature[band:band + LSH_ROWS])
+
+    def is_duplicate(self, signature: tuple[int, ...]) -> bool:
+        candidates = {i for band in self._bands(signature) for i in self._buckets.get(band, ())}
+        return any(similarity(signature, self._signatures[i]) >= self.threshold for i in candidates)
+
+    def add(self, signature: tuple[int, ...]):
+        index = len(self._signatures)
+        self._signatures.append(signature)
+        for band in self._bands(signature):
+            self._buckets.setdefault(band, []).append(index)
+
+
+@dataclass
+class CompactionStats:
+    searches_planned: int = 0
+    searches_run: int = 0
+    searches_dropped: int = 0
+    paragraphs_in: int = 0
+    paragraphs_duplicate: int = 0
+    paragraphs_over_budget: int = 0
+    tokens_before: int = 0
+    tokens_after: int = 0
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_before - self.tokens_after
+
+    def as_dict(self) -> dict:
+        return {**asdict(self), "tokens_saved": self.tokens_saved}
+
+
+def _topic_header(topic: str) -> str:
+    return f"## Informe de Investigación sobre: {topic}"
+
+
+_NO_NEW_INFORMATION = "(Sin información nueva: lo encontrado para este tema ya aparece en los temas anteriores.)"
+
+
+def render_report(topic_summaries: list[tuple[str, list[str]]], notes: dict[str, str] | None = None) -> str:
+    """
+    Formato original del informe: un bloque por tema con sus resúmenes, separados por `---`.
+    `notes` añade al final de cada tema una nota (p. ej. las búsquedas descartadas).
+    """
+    notes = notes or {}
+    return "\n\n---\n\n".join(
+        f"{_topic_header(topic)}\n\n" + ("\n\n".join(summaries) if summaries else _NO_NEW_INFORMATION)
+        + (f"\n\n{notes[topic]}" if topic in notes else "")
+        for topic, summaries in topic_summaries
+    )
+
+
+def compact_research(
+    topic_results: list[tuple[str, list[tuple[str, str]]]],
+    threshold: float = 0.7,
+    token_budget: int = 0,
+    notes: dict[str, str] | None = None,
+) -> tuple[str, CompactionStats]:
+    """
+    `topic_results` es, por tema y en orden, la lista de `(query_key, resumen)` de sus búsquedas.
+    Devuelve el informe compactado y las estadísticas de ahorro. `threshold > 1` desactiva la
+    detección de casi duplicados y `token_budget <= 0` el presupuesto. Las `notes` por tema se
+    copian tal cual, sin deduplicar ni recortar.
+    """
+    stats = CompactionStats()
+    stats.tokens_before = estimate_tokens(render_report([(topic, [s for _, s in results]) for topic, results in topic_results], notes))
+
+    index = NearDuplicateIndex(threshold)
+    seen_queries: set[str] = set()
+    seen_exact: set[str] = set()
+    # Por tema: lista de resúmenes, cada uno como lista de párrafos conservados.
+    kept: list[tuple[str, list[list[str]]]] = []
+    for topic, results in topic_results:
+        topic_summaries = []
+        for key, summary in results:
+            candidates = [p.strip() for p in summary.split("\n\n") if p.strip()]
+            stats.paragraphs_in += len(candidates)
+            if key in seen_queries:
+                stats.paragraphs_duplicate += len(candidates)
+                continue
+            seen_queries.add(key)
+            paragraphs = []
+            for paragraph in candidates:
+                normalized = normalize_text(paragraph)
+                signature = minhash(paragraph) if threshold <= 1 else None
+                if normalized in seen_exact or (signature is not None and index.is_duplicate(signature)):
+                    stats.paragraphs_duplicate += 1
+                    continue
+                seen_exact.add(normalized)
+                if signature is not None:
+                    index.add(signature)
+                paragraphs.append(paragraph)
+            if paragraphs:
+                topic_summaries.append(paragraphs)
+        kept.append((topic, topic_summaries))
+
+    if token_budget > 0:
+        kept = _apply_budget(kept, token_budget, stats)
+
+    report = render_report([(topic, ["\n\n".join(p) for p in summaries]) for topic, summaries in kept], notes)
+    stats.tokens_after = estimate_tokens(report)
+    return report, stats
+
+
+def _apply_budget(kept: list[tuple[str, list[list[str]]]], token_budget: int, stats: CompactionStats):
+    """Reparte el presupuesto por turnos: ronda r = párrafo r de cada resumen, alternando entre temas."""
+    used = sum(estimate_tokens(_topic_header(topic)) for topic, _ in kept)
+    queues = []
+    for t, (_, summaries) in enumerate(kept):
+        depth = max((len(paragraphs) for paragraphs in summaries), default=0)
+        queues.append(deque((t, s, p) for p in range(depth) for s, paragraphs in enumerate(summaries) if p < len(paragraphs)))
+
+    selected = set()
+    exhausted = False
+    while any(queues):
+        for queue in queues:
+            if not queue:
+                continue
+            t, s, p = queue.popleft()
+            cost = estimate_tokens(kept[t][1][s][p])
+            if exhausted or used + cost > token_budget:
+                exhausted = True
+                stats.paragraphs_over_budget += 1
+            else:
+                used += cost
+                selected.add((t, s, p))
+
+    trimmed = []
+    for t, (topic, summaries) in enumerate(kept):
+        summaries = [[par for p, par in enumerate(paragraphs) if (t, s, p) in selected] for s, paragraphs in enumerate(summaries)]
+        trimmed.append((topic, [paragraphs for paragraphs in summaries if paragraphs]))
+    return trimmed
@@ -2,10 +2,36 @@
 
 import asyncio
 import json
+import math
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass, field
 from pydantic import BaseModel, Field
-from logging_config import logger 
-from config import openai_client, RESEARCH_MODEL
-from agents import Agent, WebSearchTool, ModelSettings, Runner
+from logging_config import logger, sampled, debug_dump, LOG_SEARCH_SAMPLE_RATE
+from config import (
+    get_openai_client, RESEARCH_MODEL, SEARCH_MODEL,
+    RESEARCH_CACHE_PATH, RESEARCH_CACHE_PLAN_TTL, RESEARCH_CACHE_SEARCH_TTL, RESEARCH_CACHE_MAX_ENTRIES,
+    OPENAI_RPM_LIMIT, OPENAI_TPM_LIMIT, PLANNER_TOKEN_ESTIMATE, SEARCH_TOKEN_ESTIMATE,
+    RESEARCH_DEDUP_THRESHOLD, RESEARCH_TOKEN_BUDGET,
+    RESEARCH_SEARCH_DEADLINE, RESEARCH_HEDGE_PERCENTILE, RESEARCH_HEDGE_MIN_SAMPLES, RESEARCH_HEDGE_MIN_DELAY,
+    RESEARCH_SEARCH_QUORUM,
+)
+from research_cache import ResearchCache
+from rate_limiter import RateLimitScheduler
+from research_compaction import compact_research, query_key
+from hedging import LatencyTracker, hedged_call
+from metrics import track_phase, RESEARCH_TOKENS, RESEARCH_SEARCHES
+
+# --- Caché persistente de planes y resúmenes (compartida por todo el proceso) ---
+research_cache = ResearchCache(
+    path=RESEARCH_CACHE_PATH,
+    ttls={"plan": RESEARCH_CACHE_PLAN_TTL, "search": RESEARCH_CACHE_SEARCH_TTL},
+    max_entries=RESEARCH_CACHE_MAX_ENTRIES,
+)
+
+# --- Planificador global de llamadas a OpenAI (límites RPM/TPM, reparto justo entre análisis) ---
+openai_scheduler = RateLimitScheduler(requests_per_minute=OPENAI_RPM_LIMIT, tokens_per_minute=OPENAI_TPM_LIMIT)
 
 # --- Clases Pydantic (Sin cambios) ---
 class WebSearchQuery(BaseModel):
@@ -14,19 +40,36 @@ class WebSearchQuery(BaseModel):
 class WebSearchPlan(BaseModel):
     searches: list[WebSearchQuery] = Field(description="Una lista de 5 a 10 búsquedas web específicas para realizar.")
 
+async def _timed(phase: str, awaitable):
+    """Mide solo la llamada remota (sin la espera en el planificador de cupo)."""
+    with track_phase(phase):
+        return await awaitable
+
 # --- Agente 1: Planificador (Sin cambios) ---
-async def planner_agent(topic: str, update_queue: asyncio.Queue):
+async def planner_agent(topic: str, update_queue: asyncio.Queue, use_cache: bool = True, owner: str = "default"):
+    if use_cache:
+        cached_plan = await research_cache.get("plan", topic, RESEARCH_MODEL)
+        if cached_plan is not None:
+            plan = WebSearchPlan.model_validate_json(cached_plan)
+            await update_queue.put(json.dumps({"type": "status", "phase": "planning_complete", "content": f"♻️ Plan recuperado de caché para '{topic}' ({len(plan.searches)} búsquedas)."}))
+            return plan
     await update_queue.put(json.dumps({"type": "status", "phase": "planning", "content": f"🧠 Planificador: Creando plan para '{topic}'..."}))
-    response = await openai_client.chat.completions.create(
+    raw_response = await openai_scheduler.call(owner, PLANNER_TOKEN_ESTIMATE, lambda: _timed("planner", get_openai_client().chat.completions.with_raw_response.create(
         model=RESEARCH_MODEL,
         messages=[{"role": "system", "content": "Eres un asistente de investigación experto. Dado un tema, genera un plan de exactamente 5 búsquedas web específicas y detalladas para recopilar la información más relevante."}, {"role": "user", "content": f"Tema de investigación: {topic}"}],
         tools=[{"type": "function", "function": {"name": "generate_search_plan", "description": "Genera el plan de búsqueda estructurado.", "parameters": WebSearchPlan.model_json_schema()}}],
         tool_choice={"type": "function", "function": {"name": "generate_search_plan"}},
-    )
+    )))
+    response = raw_response.parse()
+    # Primero el consumo real y después las cabeceras: si el servidor informa del cupo restante, manda él.
+    openai_scheduler.settle(PLANNER_TOKEN_ESTIMATE, response.usage.total_tokens if response.usage else None)
+    openai_scheduler.observe_headers(raw_response.headers)
     tool_call = response.choices[0].message.tool_calls[0]
     function_args = json.loads(tool_call.function.arguments)
     await update_queue.put(json.dumps({"type": "status", "phase": "planning_complete", "content": f"✅ Plan creado con {len(function_args.get('searches', []))} búsquedas."}))
-    return WebSearchPlan(**function_args)
+    plan = WebSearchPlan(**function_args)
+    await research_cache.set("plan", topic, RESEARCH_MODEL, plan.model_dump_json())
+    return plan
 
 # --- Agente 2: Investigador (Definición sin cambios) ---
 INSTRUCTIONS = (
@@ -36,52 +79,214 @@ INSTRUCTIONS = (
     "gramática. Esto será consumido por alguien que sintetiza un informe, por lo que es vital que captures la "
     "esencia y ignores cualquier fluff. No incluyas ningún comentario adicional más que el resumen en sí."
 )
-search_agent = Agent( name="Agente de búsqueda", instructions=INSTRUCTIONS, tools=[WebSearchTool(search_context_size="medium")], model="gpt-4o-mini", model_settings=ModelSettings(tool_choice="required"), )
+_search_agent = None
+
+def get_search_agent():
+    """El Agents SDK tarda más de un segundo en importarse: se carga con el primer uso (o al arrancar la API)."""
+    global _search_agent
+    if _search_agent is None:
+        from agents import Agent, WebSearchTool, ModelSettings, set_default_openai_client
+        # Los agentes usan el mismo cliente (y por tanto la misma base_url) que el resto de la app.
+        set_default_openai_client(get_openai_client(), use_for_tracing=False)
+        _search_agent = Agent( name="Agente de búsqueda", instructions=INSTRUCTIONS, tools=[WebSearchTool(search_context_size="medium")], model=SEARCH_MODEL, model_settings=ModelSettings(tool_choice="required"), )
+    return _search_agent
+
+# --- Plazos, hedging y quórum de las búsquedas ---
+search_latency = LatencyTracker()
+
+def _hedge_delay() -> float | None:
+    """Segundos tras los que se lanza una búsqueda duplicada, o `None` si aún no hay datos (o está desactivado)."""
+    if RESEARCH_HEDGE_PERCENTILE <= 0:
+        return None
+    delay = search_latency.percentile(RESEARCH_HEDGE_PERCENTILE, RESEARCH_HEDGE_MIN_SAMPLES)
+    return None if delay is None else max(RESEARCH_HEDGE_MIN_DELAY, delay)
+
+async def _await_quorum(tasks: dict[str, asyncio.Task], quorum: float) -> tuple[dict[str, str], dict[str, str]]:
+    """
+    Espera las búsquedas hasta tener `ceil(quorum * n)` resúmenes (o hasta que acaben todas).
+    Devuelve `(resúmenes, descartadas)`, y las descartadas llevan su motivo: plazo superado,
+    cancelada o no esperada por haberse alcanzado ya el quórum.
+    """
+    needed = max(1, math.ceil(quorum * len(tasks)))
+    by_task = {task: key for key, task in tasks.items()}
+    summaries: dict[str, str] = {}
+    dropped: dict[str, str] = {}
+    pending = set(by_task)
+    while pending and len(summaries) < needed:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            key = by_task[task]
+            if task.cancelled():
+                dropped[key] = "cancelada"
+            elif task.result() is None:
+                dropped[key] = "plazo superado"
+            else:
+                summaries[key] = task.result()
+    for task in pending:
+        dropped[by_task[task]] = "quórum alcanzado"
+    return summaries, dropped
+
+# --- Investigación compartida entre los análisis de un lote ---
+@dataclass
+class ResearchMemo:
+    """
+    Planes y búsquedas (en curso o terminados) compartidos por varios análisis, p. ej. los de
+    `/analyze-bulk`: el mismo tema o la misma búsqueda se hace una sola vez para todo el lote.
+    Todo el lote usa un único `owner` en el planificador de OpenAI, como una sola carga de trabajo.
+    """
+    owner: str = field(default_factory=lambda: uuid.uuid4().hex)
+    plans: dict[str, asyncio.Task] = field(default_factory=dict)
+    searches: dict[str, asyncio.Task] = field(default_factory=dict)
+    # Temas que esperan cada búsqueda: cuando ya no la espera nadie (p. ej. por quórum), se cancela.
+    waiters: Counter = field(default_factory=Counter)
+
+    def shared(self, tasks: dict[str, asyncio.Task], key: str, factory) -> asyncio.Task:
+        """Devuelve la tarea de `key`, creándola con `factory()` si no existe, si falló o si se está cancelando."""
+        task = tasks.get(key)
+        # Una tarea a la que otro tema ya pidió cancelar (`release_search`) aún no está `done()`:
+        # unirse a ella acabaría en una búsqueda cancelada, así que se lanza de nuevo.
+        if task is None or task.cancelling() or (task.done() and (task.cancelled() or task.exception() is not None)):
+            task = tasks[key] = asyncio.ensure_future(factory())
+        return task
+
+    def release_search(self, key: str):
+        self.waiters[key] -= 1
+        if self.waiters[key] <= 0:
+            del self.waiters[key]
+            task = self.searches.get(key)
+            if task is not None and not task.done():
+                task.cancel()
+
+    def stats(self) -> dict:
+        return {"plans": len(self.plans), "searches": len(self.searches)}
+
+    def close(self):
+        for task in (*self.plans.values(), *self.searches.values()):
+            task.cancel()
 
 # --- Orquestador del Equipo de Investigación (LÓGICA CORREGIDA) ---
 class ResearchTeamManager:
-    async def run_search(self, query: str, update_queue: asyncio.Queue) -> str:
+    async def run_search(self, query: str, update_queue: asyncio.Queue, use_cache: bool = True, owner: str = "default") -> str | None:
+        """Resumen de la búsqueda, o `None` si se descartó por superar el plazo."""
+        if use_cache:
+            cached_summary = await research_cache.get("search", query, SEARCH_MODEL)
+            if cached_summary is not None:
+                await update_queue.put(json.dumps({"type": "status", "phase": "research", "content": f"♻️ Resumen recuperado de caché: '{query[:60]}...'", "progress": ""}))
+                return cached_summary
         await update_queue.put(json.dumps({"type": "status", "phase": "research", "content": f"🔍 Investigando: '{query[:60]}...'", "progress": ""}))
         try:
-            result = await Runner.run(search_agent, query)
+            from agents import Runner
+            search_agent = get_search_agent()
+
+            async def remote_search():
+                # Solo la llamada remota: el reloj empieza cuando el planificador ya ha concedido el cupo.
+                start = time.perf_counter()
+                result = await _timed("search", Runner.run(search_agent, query))
+                search_latency.observe(time.perf_counter() - start)
+                # Cada copia (principal o hedged) pidió su propio cupo con la estimación: se corrige con el real.
+                openai_scheduler.settle(SEARCH_TOKEN_ESTIMATE, result.context_wrapper.usage.total_tokens)
+                return result
+
+            async def sent_search():
+                # El plazo y el hedging cuentan desde que la búsqueda se envía de verdad, no desde que
+                # entra en la cola de cupo: si no, con el cupo agotado se descartarían búsquedas sin
+                # llegar a enviarlas. La copia hedged pide su propio cupo, como cualquier otra llamada.
+                return await asyncio.wait_for(
+                    hedged_call(remote_search, _hedge_delay(), lambda: openai_scheduler.call(owner, SEARCH_TOKEN_ESTIMATE, remote_search)),
+                    RESEARCH_SEARCH_DEADLINE or None,
+                )
+
+            result, hedge_won = await openai_scheduler.call(owner, SEARCH_TOKEN_ESTIMATE, sent_search)
+            RESEARCH_SEARCHES.inc(outcome="hedge" if hedge_won else "primary")
             summary = str(result.final_output)
-            log_data = {"query": query, "summary": summary}
-            logger.info("Resumen de Investigador generado", extra=log_data)
+            if sampled(LOG_SEARCH_SAMPLE_RATE):
+                log_data = {"query": query, "summary": summary, "sample_rate": LOG_SEARCH_SAMPLE_RATE}
+                logger.info("Resumen de Investigador generado", extra=log_data)
+            await research_cache.set("search", query, SEARCH_MODEL, summary)
             await update_queue.put(json.dumps({"type": "status", "phase": "research", "content": f"📄 Resumen generado para: '{query[:60]}...'", "progress": ""}))
             return summary
+        except asyncio.TimeoutError:
+            RESEARCH_SEARCHES.inc(outcome="deadline")
+            await update_queue.put(json.dumps({"type": "status", "phase": "research", "content": f"⏱️ Búsqueda descartada por superar {RESEARCH_SEARCH_DEADLINE:.0f}s: '{query[:60]}...'", "progress": ""}))
+            return None
         except Exception as e:
             error_message = f"⚠️ Error en la búsqueda para '{query}': {e}"
             logger.error(error_message)
             await update_queue.put(json.dumps({"type": "status", "phase": "error", "content": error_message}))
             return f"No se pudieron obtener resultados para la búsqueda: {query}"
 
-    async def run(self, topics: list[str], update_queue: asyncio.Queue) -> str:
-        # 1. Se crea una lista vacía para guardar los informes de cada tema.
-        topic_reports = []
-
-        # 2. Se itera sobre cada tema y se procesa de forma AISLADA.
-        for topic in topics:
-            plan = await planner_agent(topic, update_queue)
-            
-            search_tasks = [self.run_search(item.query, update_queue) for item in plan.searches]
-            search_summaries = await asyncio.gather(*search_tasks)
-            
-            # 3. Se unen los resúmenes para ESTE TEMA ÚNICAMENTE.
-            final_summary_for_topic = "\n\n".join(search_summaries)
-            
-            # 4. Se crea el informe completo para este tema y se AÑADE a la lista.
-            #    La lista 'topic_reports' ahora contiene un nuevo informe completo.
-            report_for_topic = f"## Informe de Investigación sobre: {topic}\n\n{final_summary_for_topic}"
-            topic_reports.append(report_for_topic)
-
-        # 5. UNA VEZ TERMINADO EL BUCLE, se unen todos los informes de la lista.
-        #    Esto se hace una única vez, al final.
-        consolidated_report = "\n\n---\n\n".join(topic_reports)
-        
-        # 6. Se imprime el informe consolidado final en la consola una única vez.
-        print("\n" + "#"*60)
-        print("📝 INFORME CONSOLIDADO FINAL ENVIADO AL DIRECTOR (ASSISTANT)")
-        print(consolidated_report)
-        print("#"*60 + "\n")
-        
-        return consolidated_report
\ No newline at end of file
+    async def run(self, topics: list[str], update_queue: asyncio.Queue, use_cache: bool = True,
+                  memo: ResearchMemo | None = None) -> str:
+        # Sin memo de lote, cada llamada a la herramienta es su propio "owner" del planificador global:
+        # así varios análisis simultáneos se reparten el cupo de OpenAI por turnos.
+        shared_memo = memo is not None
+        memo = memo or ResearchMemo()
+        used_keys: set[str] = set()
+        dropped: list[dict] = []
+        planned = 0
+
+        async def research_topic(topic: str) -> tuple[str, list[tuple[str, str]]]:
+            # Cada tema se procesa de forma AISLADA, pero todos los temas avanzan a la vez.
+            nonlocal planned
+            plan = await asyncio.shield(memo.shared(
+                memo.plans, query_key(topic), lambda: planner_agent(topic, update_queue, use_cache, memo.owner)))
+            planned += len(plan.searches)
+            # Búsqueda compartida por consulta normalizada: si dos temas (o dos eventos del lote)
+            # planifican la misma, se hace una vez.
+            queries = {}
+            for item in plan.searches:
+                key = query_key(item.query)
+                memo.shared(memo.searches, key, lambda query=item.query: self.run_search(query, update_queue, use_cache, memo.owner))
+                queries.setdefault(key, item.query)
+            used_keys.update(queries)
+            for key in queries:
+                memo.waiters[key] += 1
+            try:
+                summaries, topic_dropped = await _await_quorum({key: memo.searches[key] for key in queries}, RESEARCH_SEARCH_QUORUM)
+            finally:
+                for key in queries:
+                    memo.release_search(key)
+
+            results = []
+            for key, query in queries.items():
+                if key in summaries:
+                    results.append((key, summaries[key]))
+                else:
+                    dropped.append({"topic": topic, "query": query, "reason": topic_dropped[key]})
+            return topic, results
+
+        try:
+            # gather conserva el orden de `topics`, así que el informe sale igual que antes.
+            topic_results = await asyncio.gather(*(research_topic(topic) for topic in topics))
+        finally:
+            if not shared_memo:
+                memo.close()
+
+        # Las búsquedas descartadas se indican al final de su tema, para que el Director sepa que faltan.
+        notes: dict[str, list[str]] = {}
+        for item in dropped:
+            notes.setdefault(item["topic"], []).append(f"- {item['query']} ({item['reason']})")
+        notes = {topic: "Búsquedas descartadas (sin resultados en este informe):\n" + "\n".join(lines) for topic, lines in notes.items()}
+
+        # UNA VEZ TERMINADOS TODOS LOS TEMAS, se compacta el informe (duplicados, presupuesto) una única vez.
+        with track_phase("research_compaction"):
+            consolidated_report, stats = await asyncio.to_thread(
+                compact_research, topic_results, RESEARCH_DEDUP_THRESHOLD, RESEARCH_TOKEN_BUDGET, notes)
+        stats.searches_planned, stats.searches_run, stats.searches_dropped = planned, len(used_keys), len(dropped)
+        if dropped:
+            RESEARCH_SEARCHES.inc(sum(d["reason"] == "quórum alcanzado" for d in dropped), outcome="quorum_dropped")
+            await update_queue.put(json.dumps({"type": "status", "phase": "research", "content": (
+                f"✂️ {len(dropped)} búsquedas descartadas (plazo, cancelación o quórum); el Director lo verá indicado en el informe."
+            ), "dropped_searches": dropped}))
+        RESEARCH_TOKENS.inc(stats.tokens_before, stage="before")
+        RESEARCH_TOKENS.inc(stats.tokens_after, stage="after")
+        logger.info("Informe de investigación compactado", extra=stats.as_dict())
+        await update_queue.put(json.dumps({"type": "status", "phase": "research_compaction", "content": (
+            f"🧹 Informe compactado: {stats.searches_run}/{stats.searches_planned} búsquedas únicas, "
+            f"{stats.paragraphs_duplicate} párrafos duplicados eliminados, "
+            f"~{stats.tokens_saved} tokens ahorrados ({stats.tokens_before} → {stats.tokens_after})."
+        ), "stats": stats.as_dict()}))
+
+        debug_dump("📝 INFORME CONSOLIDADO FINAL ENVIADO AL DIRECTOR (ASSISTANT)", consolidated_report)
+
+        return consolidated_report
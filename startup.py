@@ -0,0 +1,53 @@
+# startup.py
+
+import inspect
+import time
+
+# Informe de arranque: cuánto tarda en importarse la API y cada paso de su inicialización (los
+# hooks de calentamiento del lifespan), para seguir el coste del arranque en frío entre versiones.
+# Se consulta en `GET /startup`, sale en el log "API lista" y lo recoge `benchmarks/run_benchmark.py`.
+# Este módulo debe ser lo primero que importa `api.py`, para que el reloj incluya todos sus imports.
+
+IMPORT_STARTED = time.perf_counter()
+
+
+class StartupReport:
+    def __init__(self, started: float):
+        self.started = started
+        self.import_seconds: float | None = None
+        self.ready_seconds: float | None = None
+        self.warmup: dict[str, float] = {}
+        self.errors: dict[str, str] = {}
+
+    def mark_imported(self):
+        self.import_seconds = time.perf_counter() - self.started
+
+    async def run_warmup(self, hooks: list[tuple[str, object]]):
+        """
+        Ejecuta en orden los hooks `(nombre, función)` (la función puede devolver una corrutina) y mide
+        cada uno. Un hook que falla se registra pero no impide arrancar: lo que calentaba se hará al usarse.
+        """
+        for name, hook in hooks:
+            start = time.perf_counter()
+            try:
+                result = hook()
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                self.errors[name] = str(e)
+            finally:
+                self.warmup[name] = time.perf_counter() - start
+        self.ready_seconds = time.perf_counter() - self.started
+
+    def as_dict(self) -> dict:
+        def ms(seconds):
+            return None if seconds is None else round(seconds * 1000, 1)
+        return {
+            "import_ms": ms(self.import_seconds),
+            "warmup_ms": {name: ms(seconds) for name, seconds in self.warmup.items()},
+            "warmup_errors": self.errors,
+            "ready_ms": ms(self.ready_seconds),
+        }
+
+
+startup_report = StartupReport(IMPORT_STARTED)
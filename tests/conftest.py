@@ -0,0 +1,7 @@
+# tests/conftest.py
+
+import os
+import sys
+
+# Los módulos de la app viven en la raíz del repositorio (sin paquete): se añade al path.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
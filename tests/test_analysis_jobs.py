@@ -0,0 +1,75 @@
+# tests/test_analysis_jobs.py
+
+import asyncio
+import json
+import time
+import pytest
+import analysis_jobs
+from analysis_jobs import END_OF_STREAM, AnalysisCoordinator, AnalysisJob, AnalysisRejected, last_event_job_id, parse_last_event_id
+
+
+# --- Registro de eventos ---
+
+def test_concurrent_puts_are_logged_in_order(tmp_path):
+    log_path = str(tmp_path / "job.jsonl")
+
+    async def scenario():
+        job = AnalysisJob("key", log_path=log_path)
+        await asyncio.gather(*(job.put(json.dumps({"type": "status", "n": i})) for i in range(50)))
+        await job.put(END_OF_STREAM)
+        return job
+
+    job = asyncio.run(scenario())
+    with open(log_path, encoding="utf-8") as f:
+        seqs = [json.loads(line)["seq"] for line in f]
+    assert seqs == list(range(1, 51)) + [50]
+    loaded = AnalysisJob.load(job.job_id, log_path)
+    assert loaded.messages == job.messages and loaded.status == job.status
+
+
+def test_followers_do_not_wait_for_disk_writes(tmp_path, monkeypatch):
+    def slow_append(path, line):
+        time.sleep(0.5)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+    monkeypatch.setattr(analysis_jobs, "_append_line", slow_append)
+
+    async def scenario():
+        job = AnalysisJob("key", log_path=str(tmp_path / "job.jsonl"))
+        follower = job.follow()
+        writer = asyncio.create_task(job.put('{"type": "status"}'))
+        start = time.monotonic()
+        first = await asyncio.wait_for(follower.__anext__(), timeout=2)
+        elapsed = time.monotonic() - start
+        await writer
+        await follower.aclose()
+        return first, elapsed
+
+    first, elapsed = asyncio.run(scenario())
+    assert first == (1, '{"type": "status"}')
+    assert elapsed < 0.3
+
+
+# --- Control de admisión ---
+
+def test_reserve_is_clamped_to_free_capacity():
+    coordinator = AnalysisCoordinator(result_ttl=0, max_results=1, max_concurrent=2, max_queued=1)
+    assert coordinator.reserve(10) == 2  # nunca más de max_concurrent
+    assert coordinator.reserve(10) == 1  # solo las que quedan libres
+    with pytest.raises(AnalysisRejected, match=r"libres: 0 de 3"):
+        coordinator.reserve(1)
+    coordinator.release(3)
+    assert coordinator.reserve(1) == 1
+
+
+# --- Last-Event-ID ---
+
+def test_last_event_id_parsing():
+    job_id = "a" * 32
+    assert last_event_job_id(f"{job_id}:7") == job_id
+    assert last_event_job_id("7") is None
+    assert last_event_job_id(None) is None
+    assert parse_last_event_id(f"{job_id}:7", job_id) == 7
+    assert parse_last_event_id(f"{'b' * 32}:7", job_id) == 0
+    assert parse_last_event_id("3", job_id) == 3
@@ -0,0 +1,82 @@
+# tests/test_incremental_json.py
+
+import json
+import random
+import pytest
+from incremental_json import IncrementalJsonParser
+
+DOCUMENT = {
+    "summary": "Texto con \"comillas\", llaves {} y corchetes [] dentro, y un \\ escapado",
+    "score": -12.5e1,
+    "flags": [True, False, None],
+    "items": [
+        {"name": "Sevilla ☀️", "tags": ["a", "b"], "price": 120},
+        {"name": "Bilbao\nnorte", "tags": [], "price": 0},
+    ],
+    "meta": {"empty": {}, "count": 2},
+}
+TEXT = json.dumps(DOCUMENT, ensure_ascii=False, indent=2)
+WATCH = [("summary",), ("score",), ("flags", "*"), ("items", "*", "name"), ("items", "*"), ("meta", "*")]
+EXPECTED = [
+    (("summary",), DOCUMENT["summary"]),
+    (("score",), DOCUMENT["score"]),
+    (("flags", 0), True),
+    (("flags", 1), False),
+    (("flags", 2), None),
+    (("items", 0, "name"), "Sevilla ☀️"),
+    (("items", 0), DOCUMENT["items"][0]),
+    (("items", 1, "name"), "Bilbao\nnorte"),
+    (("items", 1), DOCUMENT["items"][1]),
+    (("meta", "empty"), {}),
+    (("meta", "count"), 2),
+]
+
+
+def feed_chunks(chunks, watch=WATCH):
+    parser = IncrementalJsonParser(watch)
+    completed = []
+    for chunk in chunks:
+        completed.extend(parser.feed(chunk))
+    return completed
+
+
+def random_chunks(text, rng):
+    chunks, i = [], 0
+    while i < len(text):
+        size = rng.randint(1, 12)
+        chunks.append(text[i:i + size])
+        i += size
+    return chunks
+
+
+def test_whole_document():
+    assert feed_chunks([TEXT]) == EXPECTED
+
+
+def test_char_by_char():
+    assert feed_chunks(list(TEXT)) == EXPECTED
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_random_chunking(seed):
+    assert feed_chunks(random_chunks(TEXT, random.Random(seed))) == EXPECTED
+
+
+def test_values_are_emitted_as_soon_as_they_close():
+    parser = IncrementalJsonParser([("items", "*", "name")])
+    assert parser.feed('{"items": [{"name": "Sevil') == []
+    assert parser.feed('la", "price"') == [(("items", 0, "name"), "Sevilla")]
+    assert parser.feed(': 1}, {"name": "Bilbao"}]}') == [(("items", 1, "name"), "Bilbao")]
+
+
+def test_markdown_preamble_and_trailer_are_ignored():
+    text = "Aquí está el informe:\n```json\n" + TEXT + "\n```\nCualquier cosa {\"summary\": \"no\"}"
+    assert feed_chunks(list(text)) == EXPECTED
+    assert feed_chunks(random_chunks(text, random.Random(7))) == EXPECTED
+
+
+def test_root_and_scalars_at_container_end():
+    text = '[1, 2.5,true,null]'
+    assert feed_chunks(list(text), watch=[("*",), ()]) == [
+        ((0,), 1), ((1,), 2.5), ((2,), True), ((3,), None), ((), [1, 2.5, True, None]),
+    ]
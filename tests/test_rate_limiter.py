@@ -0,0 +1,97 @@
+# tests/test_rate_limiter.py
+
+import asyncio
+import time
+import pytest
+from rate_limiter import RateLimitScheduler, TokenBucket, parse_duration
+
+
+class RateLimited(Exception):
+    status_code = 429
+    response = None
+
+
+# --- Cubo de tokens ---
+
+def test_token_bucket_waits_for_refill():
+    bucket = TokenBucket(per_minute=600)  # 10 por segundo
+    assert bucket.wait_time(600) == 0
+    bucket.consume(600)
+    assert bucket.wait_time(5) == pytest.approx(0.5, abs=0.05)
+
+
+def test_token_bucket_adjust_refunds_and_charges():
+    bucket = TokenBucket(per_minute=1000)
+    bucket.rate = 0
+    bucket.consume(800)
+    bucket.adjust(500)
+    assert bucket.available == 700
+    bucket.adjust(10_000)
+    assert bucket.available == bucket.capacity
+    bucket.adjust(-1500)
+    assert bucket.available == -500
+
+
+def test_parse_duration():
+    assert parse_duration("20ms") == pytest.approx(0.02)
+    assert parse_duration("6m0s") == 360
+    assert parse_duration("1.5") == 1.5
+    assert parse_duration("") is None
+
+
+# --- Planificador ---
+
+def test_dispatch_is_round_robin_between_owners():
+    async def scenario():
+        scheduler = RateLimitScheduler(requests_per_minute=10_000, tokens_per_minute=1_000_000)
+        order = []
+
+        async def request(owner, n):
+            await scheduler.acquire(owner, 1)
+            order.append(f"{owner}{n}")
+
+        # El análisis "a" encola tres llamadas antes de que "b" pida la suya: "b" no espera a que acaben.
+        await asyncio.gather(request("a", 1), request("a", 2), request("a", 3), request("b", 1))
+        return order
+
+    assert asyncio.run(scenario()) == ["a1", "b1", "a2", "a3"]
+
+
+def test_acquire_waits_for_token_budget():
+    async def scenario():
+        scheduler = RateLimitScheduler(requests_per_minute=10_000, tokens_per_minute=600)
+        await scheduler.acquire("a", 600)
+        start = time.monotonic()
+        await scheduler.acquire("a", 3)
+        return time.monotonic() - start
+
+    assert asyncio.run(scenario()) >= 0.25
+
+
+def test_settle_returns_unused_estimate():
+    async def scenario():
+        scheduler = RateLimitScheduler(requests_per_minute=10_000, tokens_per_minute=600)
+        scheduler.tokens.rate = 0
+        await scheduler.acquire("a", 600)
+        scheduler.settle(600, 100)
+        # Lo que no se gastó vuelve al cubo: la siguiente llamada entra sin esperar.
+        await asyncio.wait_for(scheduler.acquire("a", 500), timeout=1)
+        return scheduler.tokens.available
+
+    assert asyncio.run(scenario()) == 0
+
+
+def test_call_retries_after_429():
+    async def scenario():
+        scheduler = RateLimitScheduler(requests_per_minute=10_000, tokens_per_minute=1_000_000, base_backoff=0.01)
+        attempts = []
+
+        async def factory():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise RateLimited()
+            return "ok"
+
+        return await scheduler.call("a", 1, factory), len(attempts)
+
+    assert asyncio.run(scenario()) == ("ok", 2)
@@ -0,0 +1,95 @@
+# tests/test_research_compaction.py
+
+import random
+from research_compaction import (
+    NearDuplicateIndex, compact_research, estimate_tokens, minhash, query_key, render_report, similarity,
+)
+
+_WORDS = [f"palabra{i}" for i in range(500)]
+
+
+def paragraph(seed: int, words: int = 60) -> str:
+    rng = random.Random(seed)
+    return " ".join(rng.choice(_WORDS) for _ in range(words))
+
+
+def one_word_changed(text: str) -> str:
+    words = text.split()
+    words[len(words) // 2] = "cambiada"
+    return " ".join(words)
+
+
+# --- MinHash / LSH ---
+
+def test_query_key_normalizes_variants():
+    assert query_key("  Hoteles en Málaga, 2025!") == query_key("hoteles en malaga 2025")
+
+
+def test_minhash_similarity():
+    text = paragraph(1)
+    assert similarity(minhash(text), minhash(text)) == 1.0
+    assert similarity(minhash(text), minhash(one_word_changed(text))) > 0.7
+    assert similarity(minhash(text), minhash(paragraph(2))) < 0.2
+    assert minhash("") is None
+
+
+def test_near_duplicate_index():
+    index = NearDuplicateIndex(threshold=0.7)
+    original = paragraph(1)
+    index.add(minhash(original))
+    assert index.is_duplicate(minhash(one_word_changed(original)))
+    assert not index.is_duplicate(minhash(paragraph(2)))
+
+
+# --- Compactación ---
+
+def test_near_duplicate_paragraphs_are_dropped():
+    a, b = paragraph(1), paragraph(2)
+    results = [
+        ("Tema 1", [("q1", f"{a}\n\n{b}")]),
+        ("Tema 2", [("q2", f"{one_word_changed(a)}\n\n{paragraph(3)}")]),
+    ]
+    report, stats = compact_research(results, threshold=0.7)
+    assert stats.paragraphs_in == 4
+    assert stats.paragraphs_duplicate == 1
+    assert one_word_changed(a) not in report
+    assert paragraph(3) in report
+    assert stats.tokens_saved > 0
+
+
+def test_threshold_above_one_keeps_near_duplicates_but_not_exact_ones():
+    a = paragraph(1)
+    results = [("Tema 1", [("q1", a)]), ("Tema 2", [("q2", f"{one_word_changed(a)}\n\n{a}")])]
+    report, stats = compact_research(results, threshold=1.1)
+    assert stats.paragraphs_duplicate == 1
+    assert one_word_changed(a) in report
+
+
+def test_repeated_query_appears_once_in_first_topic():
+    summary = f"{paragraph(1)}\n\n{paragraph(2)}"
+    results = [("Tema 1", [("misma", summary)]), ("Tema 2", [("misma", summary)])]
+    report, stats = compact_research(results)
+    assert report.count(paragraph(1)) == 1
+    assert stats.paragraphs_duplicate == 2
+    assert "Sin información nueva" in report.split("---")[1]
+
+
+def test_budget_is_shared_round_robin_between_topics():
+    long_topic = [("q1", "\n\n".join(paragraph(i) for i in (1, 2, 3)))]
+    short_topic = [("q2", paragraph(4))]
+    results = [("Tema largo", long_topic), ("Tema corto", short_topic)]
+    headers = estimate_tokens("## Informe de Investigación sobre: Tema largo") + estimate_tokens("## Informe de Investigación sobre: Tema corto")
+    # Cabe la cabecera de ambos temas y dos párrafos: uno de cada tema, no los dos primeros del largo.
+    budget = headers + 2 * estimate_tokens(paragraph(1)) + 10
+    report, stats = compact_research(results, token_budget=budget)
+    assert paragraph(1) in report and paragraph(4) in report
+    assert paragraph(2) not in report and paragraph(3) not in report
+    assert stats.paragraphs_over_budget == 2
+
+
+def test_notes_are_kept_verbatim_and_unbudgeted():
+    notes = {"Tema 1": "Búsquedas descartadas (sin resultados en este informe):\n- q2 (plazo superado)"}
+    results = [("Tema 1", [("q1", paragraph(1))])]
+    report, _ = compact_research(results, token_budget=1, notes=notes)
+    assert report.endswith(notes["Tema 1"])
+    assert report == render_report([("Tema 1", [])], notes)